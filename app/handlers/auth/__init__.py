@@ -3,5 +3,7 @@ from app.handlers.auth.login import login
 from app.handlers.auth.refresh_token import refresh_token
 from app.handlers.auth.verify_email import verify_email
 from app.handlers.auth.login_2fa import login_2fa
+from app.handlers.auth.jwks import jwks
+from app.handlers.auth.logout import logout
 
-__all__ = ["register", "login", "refresh_token", "verify_email", "login_2fa"] 
\ No newline at end of file
+__all__ = ["register", "login", "refresh_token", "verify_email", "login_2fa", "jwks", "logout"] 
\ No newline at end of file
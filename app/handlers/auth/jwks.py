@@ -0,0 +1,22 @@
+"""
+JWKS endpoint handler module.
+"""
+
+from fastapi import Depends, Request, Response
+from util.helper import get_auther
+from util.auth import Auther
+from app.settings import JWKS_CACHE_MAX_AGE_SECONDS
+
+async def jwks(
+    request: Request,
+    auther: Auther = Depends(get_auther)
+) -> Response:
+    """Publish the public keys that verify our tokens (pre-serialized at startup)"""
+    keyring = auther.keyring
+    headers = {
+        "Cache-Control": f"public, max-age={JWKS_CACHE_MAX_AGE_SECONDS}",
+        "ETag": keyring.jwks_etag,
+    }
+    if request.headers.get("If-None-Match") == keyring.jwks_etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=keyring.jwks, media_type="application/json", headers=headers)
@@ -1,25 +1,53 @@
-from fastapi import HTTPException, status, Depends
+from fastapi import HTTPException, status, Depends, BackgroundTasks
+from sqlalchemy import update
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.future import select
-from util.emailer import send_2fa_email
+from util.emailer import build_2fa_email
 from app.schemas import LoginCredentials, LoginResponse
-from app.models import User, TwoFactorAuthCode
-from util.helper import get_auther
+from app.models import User
+from util.helper import get_auther, get_ephemeral_store, get_email_queue, get_outbox_relay, CustomJSONResponse
 from util.auth import Auther
-from util.db import get_db
-from app.settings import REQUIRE_USERS_VERIFIED
+from util.db import SessionLocal, single_writer
+from util.sessions import get_db, get_read_db
+from util.email_queue import EmailQueue
+from util.ephemeral import EphemeralStore
+from util.outbox import OutboxRelay
+from util.two_factor import issue_2fa_code
+from util.lookups import auth_user_by_email
+from app.settings import REQUIRE_USERS_VERIFIED, ACCESS_TOKEN_VERIFIED_CLAIM
+
+
+async def rehash_password(auther: Auther, user_id, old_hash: str, password: str):
+    """Upgrade a stored hash to the current Argon2 parameters (runs after the response is sent)."""
+    try:
+        new_hash = await auther.hash_async(password)
+        async with SessionLocal() as db, single_writer.slot():
+            # Only replace the hash we verified against, in case the password changed meanwhile
+            await db.execute(
+                update(User)
+                .where(User.id == user_id, User.hashed_password == old_hash)
+                .values(hashed_password=new_hash)
+            )
+            await db.commit()
+    except Exception as e:
+        print(f"Error upgrading password hash: {str(e)}")
 
 
 async def login(
     cred: LoginCredentials, 
+    background_tasks: BackgroundTasks,
     db: AsyncSession = Depends(get_db),
+    read_db: AsyncSession = Depends(get_read_db),
     auther: Auther = Depends(get_auther),
+    store: EphemeralStore = Depends(get_ephemeral_store),
+    outbox: OutboxRelay = Depends(get_outbox_relay),
+    email_queue: EmailQueue = Depends(get_email_queue),
     require_verified: bool = REQUIRE_USERS_VERIFIED
-) -> LoginResponse:
+) -> CustomJSONResponse:
     """Authenticate user and return either full or partial token depending on 2FA requirement."""
     # 1) Retrieve user by email
-    result = await db.execute(select(User).filter(User.email == cred.email))
-    row = result.scalars().first()
+    row = await auth_user_by_email(read_db, cred.email, primary=db)
+    # Done reading: give the connection back before the slow password check
+    await read_db.release()
 
     if not row:
         raise HTTPException(
@@ -28,13 +56,17 @@ async def login(
         )
 
     # 2) Check password
-    if not auther.equals(row.hashed_password, cred.password):
+    if not await auther.equals_async(row.hashed_password, cred.password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Wrong password",
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+    # Transparently upgrade hashes made with older cost parameters
+    if auther.needs_rehash(row.hashed_password):
+        background_tasks.add_task(rehash_password, auther, row.id, row.hashed_password, cred.password)
+
     # 3) Check if verified
     if require_verified and not row.is_verified:
         raise HTTPException(
@@ -43,50 +75,40 @@ async def login(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+    payload = {"id": str(row.id), "email": row.email}
+    if ACCESS_TOKEN_VERIFIED_CLAIM and row.is_verified:
+        payload["verified"] = True
+
     # 4) If user requires 2FA, return a "partial" token, create and send 2FA code
     if row.require_2fa:
-        payload = {"id": str(row.id), "email": row.email}
         partial_token = auther.generate_partial_jwt(payload)
         
         # Store needed values before DB operations
         user_email = row.email
         code = auther.generate_2fa_code()
         
-        # Do all DB operations
-        existing_code = await db.execute(select(TwoFactorAuthCode).filter(TwoFactorAuthCode.id == row.id))
-        existing_code = existing_code.scalars().first()
-        if existing_code:
-            await db.delete(existing_code)
-            await db.commit()
-        
-        two_factor = TwoFactorAuthCode(
-            id=row.id,
-            code=code
+        # Issue the code in one step, replacing any previous code for this user, and
+        # commit its email to the outbox alongside it (or queue it, for ephemeral codes)
+        await issue_2fa_code(
+            db, store, row.id, code,
+            email=build_2fa_email(to=user_email, code=code),
+            email_queue=email_queue,
         )
-        db.add(two_factor)
-        await db.commit()
-        await db.refresh(two_factor)
 
-        # Email sending completely separate from DB operations
-        try:
-            send_2fa_email(to=user_email, code=code)
-            print(f"2FA code sent to {user_email}")
-        except Exception as e:
-            print(f"Error sending 2FA code email: {str(e)}")
+        # Sent in the background; the response doesn't wait on the email provider
+        outbox.notify()
 
-        return LoginResponse(
+        return CustomJSONResponse(LoginResponse(
             requires_2fa=True,
             partial_token=partial_token,
-        )
+        ))
 
     # 5) Otherwise, return full tokens
-    payload = {"id": str(row.id), "email": row.email}
-    access_token = auther.generate_access_jwt(payload)
-    refresh_token = auther.generate_refresh_jwt(payload)
+    access_token, refresh_token = auther.generate_token_pair(payload)
 
-    return LoginResponse(
+    return CustomJSONResponse(LoginResponse(
         requires_2fa=False,
         access_token=access_token,
         refresh_token=refresh_token,
         token_type="bearer"
-    )
+    ))
@@ -1,65 +1,44 @@
 from fastapi import HTTPException, status, Depends, Request
-from datetime import datetime, timezone
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.future import select
-from sqlalchemy.orm import joinedload
 from app.schemas import TwoFactorVerifyRequest, LoginResponse
-from app.models import User
-from util.db import get_db
-from util.helper import partial_token_header_to_user_id
+from util.sessions import get_db
+from util.helper import partial_token_header_to_claims
 from util.auth import Auther
-from util.helper import get_auther
+from util.helper import get_auther, get_ephemeral_store, CustomJSONResponse
+from util.ephemeral import EphemeralStore
+from util.two_factor import consume_2fa_code
 
 async def login_2fa(
     request: Request,
     cred: TwoFactorVerifyRequest,
     auther: Auther = Depends(get_auther),
     db: AsyncSession = Depends(get_db),
-) -> LoginResponse:
+    store: EphemeralStore = Depends(get_ephemeral_store),
+) -> CustomJSONResponse:
     """Authenticate user and return either full or partial token depending on 2FA requirement."""
     # This will validate the partial token and return the user id
-    user_id = partial_token_header_to_user_id(request)
+    user_id, claims = await partial_token_header_to_claims(request)
     
-    result = await db.execute(
-        select(User).options(joinedload(User.two_factor)).filter(User.id == user_id)
-    )
-    user = result.scalars().first()
+    # 1) Consume the code atomically: it must match and not be expired, and can only be used once
+    consumed = await consume_2fa_code(db, store, user_id, cred.code)
 
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found"
-        )
-    
-    if not user.two_factor:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="No 2FA code found",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-
-    # 2) Code must be correct and not expired
-    if cred.code != user.two_factor.code:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Wrong code",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    if user.two_factor.expires_at < datetime.now(timezone.utc):
+    if not consumed:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Code expired",
+            detail="Wrong or expired code",
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    # 3) Generate full tokens
-    payload = {"id": str(user.id), "email": user.email}
-    access_token = auther.generate_access_jwt(payload)
-    refresh_token = auther.generate_refresh_jwt(payload)
+    # 2) Generate full tokens
+    payload = {"id": str(user_id), "email": claims["email"]}
+    if claims.get("verified"):
+        # Carried over from the partial token minted at login
+        payload["verified"] = True
+    access_token, refresh_token = auther.generate_token_pair(payload)
 
-    return LoginResponse(
+    return CustomJSONResponse(LoginResponse(
         requires_2fa=False,
         access_token=access_token,
         refresh_token=refresh_token,
         token_type="bearer"
-    )
+    ))
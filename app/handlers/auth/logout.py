@@ -0,0 +1,48 @@
+"""
+Logout endpoint handler module.
+"""
+
+import uuid
+from datetime import datetime, timezone
+from fastapi import HTTPException, Request, status, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.schemas import LogoutResponse
+from util.helper import header_to_token, get_auther, get_revocations, CustomJSONResponse
+from util.auth import Auther
+from util.sessions import get_db
+from util.denylist import RevocationList
+
+async def logout(
+    request: Request,
+    auther: Auther = Depends(get_auther),
+    revocations: RevocationList = Depends(get_revocations),
+    db: AsyncSession = Depends(get_db),
+) -> CustomJSONResponse:
+    """Revoke the refresh token sent in the Authorization header"""
+    token = header_to_token(request)
+    claims = auther.validate_refresh_claims(token)
+    if not claims.get("is_valid"):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=claims.get("error", "Invalid refresh token"),
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    jti = claims.get("jti")
+    if not jti:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Token cannot be revoked"
+        )
+
+    await revocations.revoke(
+        db,
+        jti=jti,
+        expires_at=datetime.fromtimestamp(claims["exp"], timezone.utc),
+        user_id=uuid.UUID(claims["id"]),
+    )
+
+    return CustomJSONResponse(LogoutResponse(
+        revoked=True,
+        message="Refresh token revoked"
+    ))
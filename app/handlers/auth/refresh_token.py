@@ -3,14 +3,19 @@ Token refresh endpoint handler module.
 """
 
 from fastapi import HTTPException, Request, status, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.schemas import TokenData
-from util.helper import header_to_token, get_auther
+from util.helper import header_to_token, get_auther, get_revocations, CustomJSONResponse
 from util.auth import Auther
+from util.sessions import get_db
+from util.denylist import RevocationList
 
 async def refresh_token(
     request: Request,
-    auther: Auther = Depends(get_auther)
-) -> TokenData:
+    auther: Auther = Depends(get_auther),
+    revocations: RevocationList = Depends(get_revocations),
+    db: AsyncSession = Depends(get_db),
+) -> CustomJSONResponse:
     """Generate a new access token using a valid refresh token"""
     refresh_token = header_to_token(request)
     response = auther.refresh_to_access(refresh_token)
@@ -20,6 +25,18 @@ async def refresh_token(
             detail="Refresh Token Invalid",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    response["refresh_token"] = refresh_token
-    response["token_type"] = "bearer"
-    return response 
\ No newline at end of file
+
+    # The in-memory filter answers almost every check; only possible hits query the DB
+    jti = response.get("jti")
+    if jti and await revocations.is_revoked(db, jti):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Refresh Token Revoked",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    return CustomJSONResponse(TokenData(
+        access_token=response["access_token"],
+        refresh_token=refresh_token,
+        token_type="bearer"
+    ))
@@ -3,14 +3,17 @@ User registration endpoint handler module.
 """
 
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
 from fastapi import Depends, HTTPException
-from sqlalchemy import select
 from app.schemas import RegisterCredentials, PrivateProfileOut, ProfileBase
 from app.models import User, Profile
-from util.helper import get_auther
+from util.helper import get_auther, get_outbox_relay, CustomJSONResponse
 from util.auth import Auther
-from util.db import get_db
-from util.emailer import send_account_verification_email
+from util.db import single_writer
+from util.sessions import get_db
+from util.emailer import build_account_verification_email
+from util.outbox import OutboxRelay, add_to_outbox
 from app.settings import (
     REQUIRE_USERS_VERIFIED,
     DEFAULT_2FA_ON,
@@ -20,57 +23,52 @@ async def register(
     req: RegisterCredentials, 
     db: AsyncSession = Depends(get_db),
     auther: Auther = Depends(get_auther),
+    outbox: OutboxRelay = Depends(get_outbox_relay),
     require_verified: bool = REQUIRE_USERS_VERIFIED
-) -> PrivateProfileOut:
+) -> CustomJSONResponse:
     """Register a new user with email and password"""
-    
-    # Check if user with this email already exists
-    existing_user_stmt = select(User).where(User.email == req.email)
-    existing_user = await db.execute(existing_user_stmt)
-    if existing_user.scalar_one_or_none() is not None:
-        raise HTTPException(
-            status_code=409,
-            detail="A user with this email address already exists"
-        )
-    
-    # Create User record
-    new_user = User(
-        email=req.email,
-        hashed_password=auther.hash(req.password),
-        is_verified=False,
-        require_2fa=DEFAULT_2FA_ON,
-    )
-    db.add(new_user)
-    await db.flush()  # Generate user.id without committing
-    
-    new_profile = Profile(
-        id=new_user.id,
-        name=req.name
-    )
-    db.add(new_profile)
-    
-    await db.commit()
-    await db.refresh(new_user)
-    await db.refresh(new_profile)
-    
-    if require_verified:
-        verification_url = auther.generate_email_verification_url(req.email)
+    hashed_password = await auther.hash_async(req.password)
+
+    # The unique index on email is the duplicate check: no SELECT beforehand, and no
+    # race between two signups for the same address
+    async with single_writer.slot():
         try:
-            send_account_verification_email(
-                to=req.email,
-                verification_link=verification_url,
+            result = await db.execute(
+                insert(User)
+                .values(
+                    email=req.email,
+                    hashed_password=hashed_password,
+                    is_verified=False,
+                    require_2fa=DEFAULT_2FA_ON,
+                )
+                .returning(User.id, User.email, User.is_verified, User.require_2fa, User.created_at)
             )
-            print(f"Verification email sent to {req.email}")
-        except Exception as e:
-            print(f"Error sending verification email: {str(e)}")
+            new_user = result.one()
+            await db.execute(insert(Profile).values(id=new_user.id, name=req.name))
+            if require_verified:
+                # Committed with the account, so the verification email can't be lost
+                await add_to_outbox(db, build_account_verification_email(
+                    to=req.email,
+                    verification_link=auther.generate_email_verification_url(req.email),
+                ))
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()
+            raise HTTPException(
+                status_code=409,
+                detail="A user with this email address already exists"
+            )
+    
+    if require_verified:
+        outbox.notify()
     
-    return PrivateProfileOut(
+    return CustomJSONResponse(PrivateProfileOut(
         id=new_user.id,
         email=new_user.email,
         is_verified=new_user.is_verified,
         require_2fa=new_user.require_2fa,
         created_at=new_user.created_at,
         profile=ProfileBase(
-            name=new_profile.name
+            name=req.name
         )
-    )
\ No newline at end of file
+    ))
\ No newline at end of file
@@ -1,17 +1,20 @@
 from fastapi import Depends, HTTPException, status, Request
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import update
 from app.schemas import VerificationResponse
 from app.models import User
 from util.auth import Auther
-from util.helper import get_auther
-from util.db import get_db
+from util.helper import get_auther, CustomJSONResponse
+from util.db import single_writer
+from util.sessions import get_db, get_read_db
+from util.lookups import user_status_by_email, invalidate_user_status
 
 async def verify_email(
     token: str, 
     db: AsyncSession = Depends(get_db),
+    read_db: AsyncSession = Depends(get_read_db),
     auther: Auther = Depends(get_auther)
-):
+) -> CustomJSONResponse:
     """
     Verify a user's email address using the token sent to their email
     """
@@ -30,26 +33,34 @@ async def verify_email(
             detail="Invalid token, email not found"
         )
     
-    query = select(User).where(User.email == email)
-    result = await db.execute(query)
-    user = result.scalar_one_or_none()
-    
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found"
+    # Flip the flag only if it isn't set yet; the common case is this one statement
+    async with single_writer.slot():
+        result = await db.execute(
+            update(User)
+            .where(User.email == email, User.is_verified.is_not(True))
+            .values(is_verified=True)
+            .returning(User.id)
+            .execution_options(synchronize_session=False)
         )
+        user_id = result.scalar_one_or_none()
+        await db.commit()
     
-    if user.is_verified:
-        return VerificationResponse(
+    if user_id is None:
+        # Nothing changed: either already verified or no such user
+        user = await user_status_by_email(read_db, email, primary=db)
+        if not user:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="User not found"
+            )
+        return CustomJSONResponse(VerificationResponse(
             verified=True,
             message="Email already verified"
-        )
+        ))
     
-    user.is_verified = True
-    await db.commit()
+    invalidate_user_status(user_id)
     
-    return VerificationResponse(
+    return CustomJSONResponse(VerificationResponse(
         verified=True,
         message="Email verified successfully"
-    )
+    ))
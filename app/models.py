@@ -1,6 +1,6 @@
 from sqlalchemy import (
     Column, Integer, String, Boolean, DateTime,
-    ForeignKey
+    ForeignKey, JSON
 )
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
@@ -49,3 +49,30 @@ class TwoFactorAuthCode(Base):
     
     # Relationships
     user = relationship("User", back_populates="two_factor")
+
+
+class RevokedToken(Base):
+    __tablename__ = "revoked_tokens"
+
+    # Refresh tokens revoked before their expiry (logout, compromise).
+    jti = Column(String, primary_key=True)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=True, index=True)
+    expires_at = Column(DateTime, nullable=False)
+    revoked_at = Column(DateTime, nullable=False, index=True, default=lambda: datetime.now(timezone.utc))
+
+
+class EmailOutbox(Base):
+    __tablename__ = "email_outbox"
+
+    # Emails written in the same transaction as the change that triggers them,
+    # then sent by the outbox relay (util/outbox.py).
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    payload = Column(JSON, nullable=False)
+    attempts = Column(Integer, nullable=False, default=0)
+    # Next time the row may be claimed; a claim pushes it out by the lease
+    available_at = Column(DateTime, nullable=False, index=True, default=lambda: datetime.now(timezone.utc))
+    delivered_at = Column(DateTime, nullable=True, index=True)
+    # Set when the relay gives up (rejected, or out of attempts); swept like delivered rows
+    failed_at = Column(DateTime, nullable=True, index=True)
+    last_error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
@@ -4,9 +4,10 @@ from app.settings import PUBLIC, PRIVATE
 # Import centralized handlers
 from app.handlers.auth import (
     register, login, refresh_token, 
-    verify_email, login_2fa
+    verify_email, login_2fa, jwks, logout
 )
 from app.handlers.root import root
+from app.schemas import PrivateProfileOut, LoginResponse, TokenData, LogoutResponse, VerificationResponse
 
 # Create router
 router = APIRouter()
@@ -14,11 +15,17 @@ router = APIRouter()
 # HEALTH CHECK ROUTE
 router.get("/")(root)
 
+# KEY DISCOVERY ROUTE
+router.get("/.well-known/jwks.json")(jwks)
+
 # API ROUTES
-router.post(PUBLIC + "register")(register)
-router.post(PUBLIC + "login")(login)
-router.post(PUBLIC + "login-2fa")(login_2fa)
-router.get(PRIVATE + "refresh")(refresh_token) 
-router.get(PUBLIC + "verify-email")(verify_email)
+# Handlers return a CustomJSONResponse already serialized from these models, so
+# response_model only documents the schema; FastAPI doesn't re-validate it
+router.post(PUBLIC + "register", response_model=PrivateProfileOut)(register)
+router.post(PUBLIC + "login", response_model=LoginResponse)(login)
+router.post(PUBLIC + "login-2fa", response_model=LoginResponse)(login_2fa)
+router.get(PRIVATE + "refresh", response_model=TokenData)(refresh_token) 
+router.post(PRIVATE + "logout", response_model=LogoutResponse)(logout)
+router.get(PUBLIC + "verify-email", response_model=VerificationResponse)(verify_email)
 
 # USER ROUTES
\ No newline at end of file
@@ -92,6 +92,11 @@ class VerificationResponse(BaseConfig):
     verified: bool = Field(description="Whether the email was verified successfully")
     message: str = Field(description="Message providing details about the verification")
 
+class LogoutResponse(BaseConfig):
+    """Schema for logout response"""
+    revoked: bool = Field(description="Whether the refresh token was revoked")
+    message: str = Field(description="Message providing details about the logout")
+
 class LoginResponse(BaseConfig):
     """Schema for login response"""
     requires_2fa: bool = Field(description="Whether 2FA is required for this user")
@@ -5,26 +5,104 @@ load_dotenv()
 
 """JWT SETTINGS"""
 SECRET_KEY = os.getenv("SECRET_KEY", default="secret")
-JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", default="HS256")
+JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", default="HS256") # HS256, or EdDSA/ES256 with JWT_PRIVATE_KEY_PATH
+JWT_KEY_ID = os.getenv("JWT_KEY_ID", default="default") # Sent as the "kid" token header
+JWT_PRIVATE_KEY_PATH = os.getenv("JWT_PRIVATE_KEY_PATH") # PEM file, required for asymmetric algorithms
+JWT_VERIFY_KEYS = os.getenv("JWT_VERIFY_KEYS", default="") # Keys still accepted during rotation: "kid=ALG:path,..."
+JWKS_CACHE_MAX_AGE_SECONDS = int(os.getenv("JWKS_CACHE_MAX_AGE_SECONDS", default=300))
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", default=60))
 REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", default=30))
 PARTIAL_TOKEN_EXPIRE_MINUTES = int(os.getenv("PARTIAL_TOKEN_EXPIRE_MINUTES", default=5))
 TWO_FACTOR_CODE_EXPIRE_MINUTES = int(os.getenv("TWO_FACTOR_CODE_EXPIRE_MINUTES", default=5))
 PASSWORD_RESET_EXPIRE_MINUTES = int(os.getenv("PASSWORD_RESET_EXPIRE_MINUTES", default=60))
+TOKEN_CACHE_MAX_SIZE = int(os.getenv("TOKEN_CACHE_MAX_SIZE", default=10000)) # Verified tokens kept in memory, 0 disables
+REFRESH_COALESCE_WINDOW_SECONDS = float(os.getenv("REFRESH_COALESCE_WINDOW_SECONDS", default=5)) # Duplicate refreshes share one access token
+REVOCATION_FILTER_CAPACITY = int(os.getenv("REVOCATION_FILTER_CAPACITY", default=100000)) # Expected revoked refresh tokens
+REVOCATION_FILTER_ERROR_RATE = float(os.getenv("REVOCATION_FILTER_ERROR_RATE", default=0.001))
+REVOCATION_SYNC_SECONDS = float(os.getenv("REVOCATION_SYNC_SECONDS", default=30)) # Pick up revocations made by other workers
+REVOCATION_SYNC_OVERLAP_SECONDS = float(os.getenv("REVOCATION_SYNC_OVERLAP_SECONDS", default=300)) # Re-read this far back each sync (late commits, clock skew)
+REVOCATION_RELOAD_SECONDS = float(os.getenv("REVOCATION_RELOAD_SECONDS", default=3600)) # Rebuild the filter from scratch this often
+
+"""PASSWORD HASHING SETTINGS"""
+# Argon2 cost parameters. Defaults match argon2-cffi; run `python -m util.calibrate` to tune them.
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", default=3))
+ARGON2_MEMORY_COST = int(os.getenv("ARGON2_MEMORY_COST", default=65536)) # KiB
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", default=4))
+HASH_POOL_KIND = os.getenv("HASH_POOL_KIND", default="thread") # "thread" or "process"
+HASH_POOL_WORKERS = int(os.getenv("HASH_POOL_WORKERS", default=os.cpu_count() or 1))
+HASH_MEMORY_BUDGET_MIB = int(os.getenv("HASH_MEMORY_BUDGET_MIB", default=256)) # Memory allowed for concurrent hashes
+HASH_QUEUE_TIMEOUT_SECONDS = float(os.getenv("HASH_QUEUE_TIMEOUT_SECONDS", default=2))
+HASH_QUEUE_MAX_DEPTH = int(os.getenv("HASH_QUEUE_MAX_DEPTH", default=100))
+HASH_RETRY_AFTER_SECONDS = int(os.getenv("HASH_RETRY_AFTER_SECONDS", default=1))
 
 """DATABASE SETTINGS"""
 DATABASE_URL = os.getenv(
     "DATABASE_URL",
     default="sqlite+aiosqlite:///./test.db"
 ).replace("postgres://", "postgresql+asyncpg://")
+# Optional read replicas, comma-separated. Read-only queries go here when set.
+DATABASE_REPLICA_URLS = [
+    url.strip().replace("postgres://", "postgresql+asyncpg://")
+    for url in os.getenv("DATABASE_REPLICA_URLS", default="").split(",") if url.strip()
+]
+REPLICA_SELECTION = os.getenv("REPLICA_SELECTION", default="round_robin") # "round_robin" or "least_loaded"
+REPLICA_EJECT_SECONDS = float(os.getenv("REPLICA_EJECT_SECONDS", default=30)) # How long a failing replica is skipped
+DB_ECHO = os.getenv("DB_ECHO", default="false").lower() == "true" # Log every SQL statement (development only)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", default=5)) # Connections kept open
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", default=10)) # Extra connections allowed under load
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", default=30)) # Seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", default=1800)) # Reconnect connections older than this, -1 disables
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", default="false").lower() == "true" # Ping on every checkout (a round trip each); DB_POOL_RECYCLE covers idle drops
+DB_PREPARED_STATEMENT_CACHE_SIZE = int(os.getenv("DB_PREPARED_STATEMENT_CACHE_SIZE", default=256)) # Per-connection server-side prepared statements (asyncpg only), 0 disables
+DB_QUERY_TIMINGS = os.getenv("DB_QUERY_TIMINGS", default="false").lower() == "true" # Record compile/execute time per labelled query
+SWEEP_INTERVAL_SECONDS = float(os.getenv("SWEEP_INTERVAL_SECONDS", default=300)) # Delete expired 2FA codes, revoked tokens, ... this often
+SWEEP_BATCH_SIZE = int(os.getenv("SWEEP_BATCH_SIZE", default=500)) # Rows per delete transaction
+SWEEP_MAX_BATCHES = int(os.getenv("SWEEP_MAX_BATCHES", default=20)) # Per table per run; the rest waits for the next run
+SWEEP_JITTER = float(os.getenv("SWEEP_JITTER", default=0.2)) # Randomize the interval by this fraction
+# SQLite only: WAL journal, synchronous=NORMAL and bigger caches. Much faster commits; the last
+# few transactions can be lost on power failure (never corrupted). Meant for single-node installs.
+SQLITE_PERFORMANCE_MODE = os.getenv("SQLITE_PERFORMANCE_MODE", default="false").lower() == "true"
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", default=268435456)) # Bytes of the file to memory-map
+SQLITE_CACHE_SIZE_KIB = int(os.getenv("SQLITE_CACHE_SIZE_KIB", default=65536)) # Page cache per connection
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", default=5000)) # Wait this long for a lock before "database is locked"
+SQLITE_SERIALIZE_WRITES = os.getenv("SQLITE_SERIALIZE_WRITES", default="true").lower() == "true" # Queue write transactions in-process (with SQLITE_PERFORMANCE_MODE only)
+
+"""EPHEMERAL STATE SETTINGS"""
+EPHEMERAL_STORE = os.getenv("EPHEMERAL_STORE", default="memory") # "memory" (single worker only) or "redis" (needs `pip install redis`)
+EPHEMERAL_REDIS_URL = os.getenv("EPHEMERAL_REDIS_URL", default="redis://localhost:6379/0")
+TWO_FACTOR_CODE_STORE = os.getenv("TWO_FACTOR_CODE_STORE", default="sql") # "sql" or "ephemeral"
 
 """IF USING EMAIL VERIFICATION. OTHERWISE, SAFE TO IGNORE."""
 REQUIRE_USERS_VERIFIED = bool(os.getenv("REQUIRE_USERS_VERIFIED", default=False))
+USER_STATUS_CACHE_SECONDS = float(os.getenv("USER_STATUS_CACHE_SECONDS", default=30)) # How long other workers may see a stale verified/deleted status
+USER_STATUS_CACHE_MAX_SIZE = int(os.getenv("USER_STATUS_CACHE_MAX_SIZE", default=10000)) # 0 disables
+# Put a "verified" claim in new tokens so verified users skip the status check entirely.
+# Tradeoff: a deleted user's access token keeps working until it expires.
+ACCESS_TOKEN_VERIFIED_CLAIM = os.getenv("ACCESS_TOKEN_VERIFIED_CLAIM", default="false").lower() == "true"
 DEFAULT_2FA_ON = bool(os.getenv("DEFAULT_2FA_ON", default=False))
 EMAIL_VERIFICATION_EXPIRE_MINUTES = int(os.getenv("EMAIL_VERIFICATION_EXPIRE_MINUTES", default=15))
-RESEND_API_KEY = os.getenv("RESEND_API_KEY")
+RESEND_API_KEY = os.getenv("RESEND_API_KEY") # Without it emails are discarded, or startup fails if an email feature above is on
 EMAIL_SENDER_DOMAIN = os.getenv("EMAIL_SENDER_DOMAIN")
 EMAIL_SENDER_NAME = os.getenv("EMAIL_SENDER_NAME")
+RESEND_API_URL = os.getenv("RESEND_API_URL", default="https://api.resend.com") # Point at a local fake server in tests
+EMAIL_HTTP_TIMEOUT_SECONDS = float(os.getenv("EMAIL_HTTP_TIMEOUT_SECONDS", default=10)) # Per request to the email provider
+EMAIL_HTTP_CONNECT_TIMEOUT_SECONDS = float(os.getenv("EMAIL_HTTP_CONNECT_TIMEOUT_SECONDS", default=3))
+EMAIL_HTTP_MAX_CONCURRENCY = int(os.getenv("EMAIL_HTTP_MAX_CONCURRENCY", default=4)) # Requests in flight to the provider, also the pool size
+EMAIL_HTTP_KEEPALIVE_SECONDS = float(os.getenv("EMAIL_HTTP_KEEPALIVE_SECONDS", default=60)) # Idle connections are kept this long
+EMAIL_TEMPLATE_DIR = os.getenv("EMAIL_TEMPLATE_DIR", default="") # Overrides for util/email_templates/*.html|txt
+EMAIL_TRANSPORT = os.getenv("EMAIL_TRANSPORT", default="resend") # "resend", "smtp", "memory" (tests/local) or "none"
+EMAIL_QUEUE_MAX_SIZE = int(os.getenv("EMAIL_QUEUE_MAX_SIZE", default=1000)) # Emails waiting to be sent; past this 2FA logins get a 503
+EMAIL_QUEUE_RETRY_AFTER_SECONDS = int(os.getenv("EMAIL_QUEUE_RETRY_AFTER_SECONDS", default=5)) # Retry-After sent with that 503
+EMAIL_QUEUE_WORKERS = int(os.getenv("EMAIL_QUEUE_WORKERS", default=2))
+EMAIL_BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", default=50)) # Resend accepts up to 100 per batch
+EMAIL_BATCH_WAIT_SECONDS = float(os.getenv("EMAIL_BATCH_WAIT_SECONDS", default=0.05)) # How long a batch waits to fill up
+EMAIL_MAX_RETRIES = int(os.getenv("EMAIL_MAX_RETRIES", default=3))
+EMAIL_RETRY_BASE_SECONDS = float(os.getenv("EMAIL_RETRY_BASE_SECONDS", default=1)) # Doubles on each retry
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", default=5)) # Relay check for emails written by other workers
+OUTBOX_LEASE_SECONDS = float(os.getenv("OUTBOX_LEASE_SECONDS", default=60)) # A claimed email is retried after this if its relay dies
+OUTBOX_AUTH_RETRY_MAX_SECONDS = float(os.getenv("OUTBOX_AUTH_RETRY_MAX_SECONDS", default=300)) # Longest wait between tries while the provider refuses our key
+SMTP_HOST = os.getenv("SMTP_HOST", default="localhost")
+SMTP_PORT = int(os.getenv("SMTP_PORT", default=1025))
 
 """NETWORK SETTINGS"""
 ALLOWED_ORIGINS = [
@@ -0,0 +1,77 @@
+"""
+Concurrent-request latency while a burst of logins is hashing.
+
+Runs a burst of Argon2 verifications next to a stream of trivial "requests"
+(coroutines that only need the event loop) and reports how long the trivial
+requests wait, first with inline hashing and then with the worker pool.
+
+    python -m bench.bench_hashing --logins 32 --workers 4
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from util.auth import Auther, create_hash_executor
+
+
+async def _light_requests(stop: asyncio.Event, interval: float):
+    """Simulate cheap requests (health checks, cached reads) and record how late they run."""
+    latencies = []
+    while not stop.is_set():
+        arrived = time.perf_counter()
+        await asyncio.sleep(interval)
+        latencies.append(time.perf_counter() - arrived - interval)
+    return latencies
+
+
+async def _run(auther: Auther, hashed: str, logins: int, pooled: bool):
+    async def login():
+        if pooled:
+            await auther.equals_async(hashed, "Password123")
+        else:
+            auther.equals(hashed, "Password123")
+        # Latency as seen by the client: from the burst arriving to this response.
+        return time.perf_counter() - start
+
+    stop = asyncio.Event()
+    light = asyncio.create_task(_light_requests(stop, interval=0.001))
+    await asyncio.sleep(0.01)
+    start = time.perf_counter()
+    login_latencies = await asyncio.gather(*(login() for _ in range(logins)))
+    wall = time.perf_counter() - start
+    stop.set()
+    light_latencies = await light
+    return wall, login_latencies, light_latencies
+
+
+def _report(label, wall, login_latencies, light_latencies):
+    light_ms = sorted(x * 1000 for x in light_latencies)
+    p99 = light_ms[int(len(light_ms) * 0.99) - 1] if light_ms else 0.0
+    print(f"{label}")
+    print(f"  burst wall time     : {wall * 1000:8.1f} ms")
+    print(f"  login mean latency  : {statistics.mean(login_latencies) * 1000:8.1f} ms")
+    print(f"  light requests done : {len(light_ms):8d}")
+    print(f"  light p50 / p99 / max: {statistics.median(light_ms):.2f} / {p99:.2f} / {light_ms[-1]:.2f} ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--logins", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--kind", choices=["thread", "process"], default="thread")
+    args = parser.parse_args()
+
+    inline = Auther()
+    hashed = inline.hash("Password123")
+    _report("inline (before)", *await _run(inline, hashed, args.logins, pooled=False))
+
+    pooled = Auther(executor=create_hash_executor(args.kind, args.workers))
+    try:
+        await pooled.equals_async(hashed, "Password123")  # warm up the pool
+        _report(f"{args.kind} pool x{args.workers} (after)", *await _run(pooled, hashed, args.logins, pooled=True))
+    finally:
+        pooled.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
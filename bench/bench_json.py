@@ -0,0 +1,92 @@
+"""
+Response serialization cost for the auth endpoints' schemas.
+
+"before" is what FastAPI did with a returned model: re-validate it against the
+route's response_model, convert it with jsonable_encoder, then json.dumps with the
+UUIDEncoder callback. "after" is CustomJSONResponse.render on the model itself
+(model_dump_json). "orjson" renders the same content as a plain dict, the path
+non-model responses take when orjson is installed (building that dict is not
+counted).
+
+Every path's output is checked to decode to the same JSON before timing.
+
+    python -m bench.bench_json --seconds 1
+"""
+import argparse
+import json
+import time
+import uuid
+from datetime import datetime, timezone
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+from app.schemas import LoginResponse, PrivateProfileOut, ProfileBase, TokenData
+from util.helper import CustomJSONResponse, UUIDEncoder, orjson
+
+TOKEN = "eyJhbGciOiJIUzI1NiIsImtpZCI6ImRlZmF1bHQiLCJ0eXAiOiJKV1QifQ." + "e" * 180 + ".sig"
+
+SAMPLES = {
+    "PrivateProfileOut": PrivateProfileOut(
+        id=uuid.uuid4(),
+        email="user@example.com",
+        is_verified=True,
+        require_2fa=False,
+        created_at=datetime.now(timezone.utc),
+        profile=ProfileBase(name="Plankton"),
+    ),
+    "LoginResponse": LoginResponse(requires_2fa=False, access_token=TOKEN, refresh_token=TOKEN, token_type="bearer"),
+    "TokenData": TokenData(access_token=TOKEN, refresh_token=TOKEN),
+}
+
+
+def _run(coro):
+    # serialize_response never suspends for async handlers, so drive it inline
+    try:
+        coro.send(None)
+    except StopIteration as e:
+        return e.value
+    raise RuntimeError("serialize_response suspended")
+
+
+def _before(field, model) -> bytes:
+    content = _run(serialize_response(field=field, response_content=model))
+    return json.dumps(
+        content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":"), cls=UUIDEncoder
+    ).encode("utf-8")
+
+
+def _rate(fn, seconds: float) -> float:
+    count = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        fn()
+        count += 1
+    return count / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=float, default=1.0)
+    args = parser.parse_args()
+
+    render = CustomJSONResponse.render
+    print(f"{'schema':<18} {'before µs':>10} {'after µs':>9} {'orjson µs':>10} {'bytes':>6}")
+    for name, model in SAMPLES.items():
+        field = create_model_field(name=f"Response_{name}", type_=type(model), mode="serialization")
+        as_dict = model.model_dump()
+
+        expected = json.loads(_before(field, model))
+        assert json.loads(render(None, model)) == expected, name
+        if orjson is not None:
+            assert json.loads(render(None, as_dict)) == expected, name
+
+        before = _rate(lambda: _before(field, model), args.seconds)
+        after = _rate(lambda: render(None, model), args.seconds)
+        fast = _rate(lambda: render(None, as_dict), args.seconds) if orjson is not None else 0
+        print(
+            f"{name:<18} {1e6 / before:>10.2f} {1e6 / after:>9.2f} "
+            f"{(f'{1e6 / fast:.2f}' if fast else 'n/a'):>10} {len(render(None, model)):>6}"
+        )
+
+
+if __name__ == "__main__":
+    main()
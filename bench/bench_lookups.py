@@ -0,0 +1,118 @@
+"""
+User lookup cost: ORM entities vs column projections.
+
+Fills a throwaway SQLite database with users, then looks users up by email the way
+login used to (select(User) through the ORM) and the way util.lookups does (a
+column-only select wrapped in a slotted AuthUser).
+
+Two measurements per path:
+- "sqlalchemy": a synchronous session on the same file, so the numbers show the
+  statement, result and object overhead without aiosqlite's thread hand-off.
+  Reports lookups/s, allocated blocks per lookup and peak bytes per lookup.
+- "end to end": the async session the app uses, in lookups/s.
+
+    python -m bench.bench_lookups --users 1000 --lookups 5000
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from app.models import User
+from util.db import Base
+from util.lookups import AuthUser, auth_user_by_email, _auth_user_by_email_stmt
+
+
+def _orm_lookup(db: Session, email: str):
+    return db.execute(select(User).filter(User.email == email)).scalars().first()
+
+def _projection_lookup(db: Session, email: str):
+    # Same statement and row wrapping as util.lookups.auth_user_by_email
+    row = db.execute(_auth_user_by_email_stmt(email)).first()
+    return AuthUser(*row) if row is not None else None
+
+
+def _measure_sync(engine, lookup, emails, lookups: int):
+    with Session(engine) as db:
+        for email in emails[:50]:
+            lookup(db, email)
+
+        start = time.perf_counter()
+        for i in range(lookups):
+            lookup(db, emails[i % len(emails)])
+        rate = lookups / (time.perf_counter() - start)
+
+        # Allocations per lookup: blocks allocated while the lookup runs (freed or not)
+        samples = 200
+        tracemalloc.start()
+        peak_total = 0
+        blocks_total = 0
+        for i in range(samples):
+            tracemalloc.reset_peak()
+            before = tracemalloc.take_snapshot()
+            base = tracemalloc.get_traced_memory()[0]
+            user = lookup(db, emails[i % len(emails)])
+            peak_total += tracemalloc.get_traced_memory()[1] - base
+            after = tracemalloc.take_snapshot()
+            blocks_total += sum(stat.count_diff for stat in after.compare_to(before, "filename") if stat.count_diff > 0)
+            del user
+        tracemalloc.stop()
+    return rate, blocks_total / samples, peak_total / samples
+
+
+async def _measure_async(engine, lookup, emails, lookups: int) -> float:
+    async with AsyncSession(engine) as db:
+        for email in emails[:50]:
+            await lookup(db, email)
+        start = time.perf_counter()
+        for i in range(lookups):
+            await lookup(db, emails[i % len(emails)])
+        return lookups / (time.perf_counter() - start)
+
+async def _orm_lookup_async(db: AsyncSession, email: str):
+    return (await db.execute(select(User).filter(User.email == email))).scalars().first()
+
+
+async def main(users: int, lookups: int):
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    sync_engine = create_engine(f"sqlite:///{path}")
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    try:
+        emails = [f"user{i}@example.com" for i in range(users)]
+        with sync_engine.begin() as conn:
+            Base.metadata.create_all(conn)
+            conn.execute(insert(User), [
+                {"email": email, "hashed_password": "$argon2id$" + "x" * 86, "is_verified": True}
+                for email in emails
+            ])
+        random.shuffle(emails)
+
+        print("sqlalchemy (sync session)")
+        print(f"  {'path':<12} {'lookups/s':>10} {'blocks/lookup':>14} {'peak B/lookup':>14}")
+        for name, lookup in (("orm", _orm_lookup), ("projection", _projection_lookup)):
+            rate, blocks, peak = _measure_sync(sync_engine, lookup, emails, lookups)
+            print(f"  {name:<12} {rate:>10,.0f} {blocks:>14,.1f} {peak:>14,.0f}")
+
+        print("end to end (async session)")
+        print(f"  {'path':<12} {'lookups/s':>10}")
+        for name, lookup in (("orm", _orm_lookup_async), ("projection", auth_user_by_email)):
+            rate = await _measure_async(async_engine, lookup, emails, lookups)
+            print(f"  {name:<12} {rate:>10,.0f}")
+    finally:
+        sync_engine.dispose()
+        await async_engine.dispose()
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--lookups", type=int, default=5000)
+    args = parser.parse_args()
+    asyncio.run(main(args.users, args.lookups))
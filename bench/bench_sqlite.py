@@ -0,0 +1,82 @@
+"""
+SQLite commit throughput with and without the performance profile.
+
+Runs concurrent writers against a throwaway database file, each committing one
+small insert per transaction (like register, logout or 2FA issuance), in three
+configurations:
+- default: rollback journal, synchronous=FULL, writers contend on the file lock
+- profile: SQLITE_PERFORMANCE_MODE pragmas (WAL, synchronous=NORMAL, ...)
+- profile+queue: the pragmas plus the in-process single-writer queue
+
+    python -m bench.bench_sqlite --writers 16 --commits 100
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import exc, insert
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from app.models import RevokedToken
+from util.db import Base, SingleWriter, apply_sqlite_profile
+
+
+async def _writer(engine, writer: SingleWriter, commits: int, errors: list):
+    expires_at = datetime.now() + timedelta(days=1)
+    async with AsyncSession(engine) as db:
+        for _ in range(commits):
+            try:
+                async with writer.slot():
+                    await db.execute(insert(RevokedToken).values(jti=uuid.uuid4().hex, expires_at=expires_at))
+                    await db.commit()
+            except exc.OperationalError:
+                # "database is locked"
+                await db.rollback()
+                errors.append(1)
+
+
+async def _run(profile: bool, queue: bool, writers: int, commits: int):
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    # A queue pool like the app's, so pragmas are set once per connection rather than per checkout
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{path}", poolclass=AsyncAdaptedQueuePool, pool_size=writers, max_overflow=0
+    )
+    if profile:
+        apply_sqlite_profile(engine)
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        writer = SingleWriter(enabled=queue)
+        errors = []
+        start = time.perf_counter()
+        await asyncio.gather(*(_writer(engine, writer, commits, errors) for _ in range(writers)))
+        elapsed = time.perf_counter() - start
+        return (writers * commits - len(errors)) / elapsed, len(errors)
+    finally:
+        await engine.dispose()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+
+async def main(writers: int, commits: int):
+    print(f"{'mode':<14} {'commits/s':>10} {'locked errors':>14}")
+    for name, profile, queue in (
+        ("default", False, False),
+        ("profile", True, False),
+        ("profile+queue", True, True),
+    ):
+        rate, errors = await _run(profile, queue, writers, commits)
+        print(f"{name:<14} {rate:>10,.0f} {errors:>14}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--writers", type=int, default=16)
+    parser.add_argument("--commits", type=int, default=100)
+    args = parser.parse_args()
+    asyncio.run(main(args.writers, args.commits))
@@ -0,0 +1,89 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from fastapi import HTTPException, status
+from app.settings import (
+    HASH_MEMORY_BUDGET_MIB,
+    HASH_QUEUE_TIMEOUT_SECONDS,
+    HASH_QUEUE_MAX_DEPTH,
+    HASH_RETRY_AFTER_SECONDS,
+)
+
+class HashAdmission:
+    """
+    Admission control for password hashing.
+    Every Argon2 call allocates `memory_cost` KiB, so the number of hashes allowed
+    to run at once is derived from a memory budget. Excess work waits in a bounded
+    queue and is shed with a 503 once the queue is full or the wait deadline passes.
+    """
+    def __init__(
+        self,
+        memory_cost_kib: int,
+        budget_mib: int = HASH_MEMORY_BUDGET_MIB,
+        queue_timeout: float = HASH_QUEUE_TIMEOUT_SECONDS,
+        max_queue_depth: int = HASH_QUEUE_MAX_DEPTH,
+        retry_after: int = HASH_RETRY_AFTER_SECONDS,
+    ):
+        self.slots = max(1, (budget_mib * 1024) // memory_cost_kib)
+        self.queue_timeout = queue_timeout
+        self.max_queue_depth = max_queue_depth
+        self.retry_after = retry_after
+        self._semaphore = asyncio.Semaphore(self.slots)
+
+        # Metrics
+        self.in_flight = 0
+        self.queue_depth = 0
+        self.admitted = 0
+        self.shed = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def _reject(self):
+        self.shed += 1
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is busy, please retry shortly",
+            headers={"Retry-After": str(self.retry_after)},
+        )
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold one hashing slot for the duration of the block."""
+        if self._semaphore.locked() and self.queue_depth >= self.max_queue_depth:
+            self._reject()
+
+        start = time.perf_counter()
+        self.queue_depth += 1
+        try:
+            # Not wait_for: before 3.12 it can take the permit just as the timeout
+            # cancels the wait, and that permit is never released
+            async with asyncio.timeout(self.queue_timeout):
+                await self._semaphore.acquire()
+        except asyncio.TimeoutError:
+            self._reject()
+        finally:
+            self.queue_depth -= 1
+            waited = time.perf_counter() - start
+            self.total_wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+
+        self.admitted += 1
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    def stats(self) -> dict:
+        """Snapshot of admission metrics."""
+        waits = self.admitted + self.shed
+        return {
+            "slots": self.slots,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "avg_wait_seconds": self.total_wait_seconds / waits if waits else 0.0,
+            "max_wait_seconds": self.max_wait_seconds,
+        }
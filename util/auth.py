@@ -1,26 +1,93 @@
 from argon2 import PasswordHasher
-from datetime import datetime, timedelta, timezone
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import nullcontext
+from typing import Optional, Tuple
+import asyncio
+import hashlib
+import time
+import uuid
 import jwt
 import string
 import random
 from app.settings import (
-    SECRET_KEY, 
-    JWT_ALGORITHM, 
     ACCESS_TOKEN_EXPIRE_MINUTES, 
     REFRESH_TOKEN_EXPIRE_DAYS,
     EMAIL_VERIFICATION_EXPIRE_MINUTES,
     PARTIAL_TOKEN_EXPIRE_MINUTES,
-    CLIENT_BASE_URL
+    CLIENT_BASE_URL,
+    HASH_POOL_KIND,
+    HASH_POOL_WORKERS,
+    ARGON2_TIME_COST,
+    ARGON2_MEMORY_COST,
+    ARGON2_PARALLELISM,
+    TOKEN_CACHE_MAX_SIZE,
+    REFRESH_COALESCE_WINDOW_SECONDS,
 )
+from util.admission import HashAdmission
+from util.cache import TTLCache
+from util.keys import KeyRing
 
-hasher = PasswordHasher()
+def build_hasher(
+    time_cost: int = ARGON2_TIME_COST,
+    memory_cost: int = ARGON2_MEMORY_COST,
+    parallelism: int = ARGON2_PARALLELISM,
+) -> PasswordHasher:
+    """Create an Argon2 hasher with the configured cost parameters."""
+    return PasswordHasher(time_cost=time_cost, memory_cost=memory_cost, parallelism=parallelism)
+
+hasher = build_hasher()
+
+#######################################
+# HASHING WORKERS
+#######################################
+
+# Module-level so they can be pickled and sent to a process pool.
+def _hash_password(text):
+    return hasher.hash(text)
+
+def _verify_password(hashed, text):
+    try:
+        return hasher.verify(hashed, text)
+    except Exception:
+        return False
+
+def create_hash_executor(kind: str = HASH_POOL_KIND, workers: int = HASH_POOL_WORKERS) -> Executor:
+    """Create the worker pool that runs Argon2 off the event loop."""
+    if kind == "process":
+        return ProcessPoolExecutor(max_workers=workers)
+    if kind == "thread":
+        # argon2-cffi releases the GIL while hashing, so threads scale well.
+        return ThreadPoolExecutor(max_workers=workers, thread_name_prefix="argon2")
+    raise ValueError(f"Unknown HASH_POOL_KIND: {kind}")
+
+def token_digest(token: str) -> bytes:
+    """Compact key identifying a token in caches"""
+    return hashlib.blake2b(token.encode(), digest_size=16).digest()
 
 class Auther:
     """
     Authentication utility class for handling password hashing and JWT operations.
     """
-    def __init__(self):
-        self.hasher = PasswordHasher()
+    def __init__(
+        self,
+        executor: Optional[Executor] = None,
+        admission: Optional[HashAdmission] = None,
+        keyring: Optional[KeyRing] = None,
+    ):
+        self.hasher = build_hasher()
+        self.executor = executor
+        self.admission = admission
+        # Claims of recently verified tokens, keyed by token digest, kept until the token's exp
+        self.token_cache = TTLCache(max_size=TOKEN_CACHE_MAX_SIZE)
+        self.keyring = keyring if keyring is not None else KeyRing.from_settings()
+        # Access tokens recently minted per refresh token digest, so tabs refreshing together share one
+        self.recent_refreshes = TTLCache(max_size=TOKEN_CACHE_MAX_SIZE)
+
+    def shutdown(self):
+        """Release the hashing worker pool."""
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
 
     def hash(self, text):
         """Hash a password using Argon2"""
@@ -35,41 +102,77 @@ class Auther:
             result = False
         return result
 
+    def needs_rehash(self, hashed):
+        """Check whether a stored hash was made with outdated cost parameters"""
+        try:
+            return self.hasher.check_needs_rehash(hashed)
+        except Exception:
+            return False
+
+    def _admit(self):
+        return self.admission.slot() if self.admission is not None else nullcontext()
+
+    async def hash_async(self, text):
+        """Hash a password using Argon2 without blocking the event loop"""
+        loop = asyncio.get_running_loop()
+        async with self._admit():
+            return await loop.run_in_executor(self.executor, _hash_password, text)
+
+    async def equals_async(self, text1, text2):
+        """Verify if a plaintext matches a hash without blocking the event loop"""
+        loop = asyncio.get_running_loop()
+        async with self._admit():
+            return await loop.run_in_executor(self.executor, _verify_password, text1, text2)
+
     #######################################
     # TOKEN GENERATION METHODS
     #######################################
 
+    def _encode(self, payload: dict) -> str:
+        """Sign a payload with the current key, naming it in the kid header."""
+        return self.keyring.current.sign(payload)
+
     def generate_partial_jwt(self, payload: dict) -> str:
         """Generate a short-lived token indicating 2FA is still needed."""
         payload_copy = payload.copy()
-        expire = datetime.now(timezone.utc) + timedelta(minutes=PARTIAL_TOKEN_EXPIRE_MINUTES)
+        expire = int(time.time()) + PARTIAL_TOKEN_EXPIRE_MINUTES * 60
         payload_copy.update({"exp": expire, "type": "partial"})
-        encoded = jwt.encode(payload_copy, SECRET_KEY, algorithm=JWT_ALGORITHM)
+        encoded = self._encode(payload_copy)
         return encoded
         
     def generate_access_jwt(self, payload):
         """Generate an access token with standard expiration time."""
         payload_copy = payload.copy()
-        expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+        expire = int(time.time()) + ACCESS_TOKEN_EXPIRE_MINUTES * 60
         payload_copy.update({"exp": expire, "type":"access"})
-        encoded = jwt.encode(payload_copy, SECRET_KEY, algorithm=JWT_ALGORITHM)
+        encoded = self._encode(payload_copy)
         return encoded
     
     def generate_email_verify_jwt(self, payload):
         """Generate an email verification token."""
         payload_copy = payload.copy()
-        expire = datetime.now(timezone.utc) + timedelta(minutes=EMAIL_VERIFICATION_EXPIRE_MINUTES)
+        expire = int(time.time()) + EMAIL_VERIFICATION_EXPIRE_MINUTES * 60
         payload_copy.update({"exp": expire, "type":"email"})
-        encoded = jwt.encode(payload_copy, SECRET_KEY, algorithm=JWT_ALGORITHM)
+        encoded = self._encode(payload_copy)
         return encoded
 
     def generate_refresh_jwt(self, payload):
         """Generate a long-lived refresh token."""
         payload_copy = payload.copy()
-        expire = datetime.now(timezone.utc) + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
-        payload_copy.update({"exp": expire, "type":"refresh"})
-        encoded = jwt.encode(payload_copy, SECRET_KEY, algorithm=JWT_ALGORITHM)
+        expire = int(time.time()) + REFRESH_TOKEN_EXPIRE_DAYS * 86400
+        payload_copy.update({"exp": expire, "type":"refresh", "jti": uuid.uuid4().hex})
+        encoded = self._encode(payload_copy)
         return encoded
+
+    def generate_token_pair(self, payload: dict) -> Tuple[str, str]:
+        """Generate an access and a refresh token from a single claims build."""
+        now = int(time.time())
+        claims = payload.copy()
+        claims.update({"exp": now + ACCESS_TOKEN_EXPIRE_MINUTES * 60, "type": "access"})
+        access_token = self._encode(claims)
+        claims.update({"exp": now + REFRESH_TOKEN_EXPIRE_DAYS * 86400, "type": "refresh", "jti": uuid.uuid4().hex})
+        refresh_token = self._encode(claims)
+        return access_token, refresh_token
         
     def generate_email_verification_url(self, email):
         """Generate a complete URL for email verification."""
@@ -86,66 +189,69 @@ class Auther:
     # TOKEN VALIDATION METHODS
     #######################################
 
-    def validate_partial_jwt(self, token):
-        """Validate a partial token used for 2FA flow."""
+    def _decode_jwt(self, token):
+        """Decode and verify a token, reusing claims already verified for the same token."""
+        key = token_digest(token)
+        decoded = self.token_cache.get(key)
+        if decoded is None:
+            signing_key = self.keyring.verification_key(token)
+            decoded = jwt.decode(token, signing_key.verifying_key, algorithms=[signing_key.algorithm])
+            if "exp" in decoded:
+                self.token_cache.set(key, decoded, decoded["exp"])
+        return decoded
+
+    def _validate_jwt(self, token, expected_type, label):
+        """Shared validation path: verify the token and check its type."""
         response = dict()
         try:
-            decoded = jwt.decode(token, SECRET_KEY, algorithms=[JWT_ALGORITHM])
-            if decoded.get("type") == "partial":
+            decoded = self._decode_jwt(token)
+            if decoded.get("type") == expected_type:
                 response.update({"is_valid":True})
                 response.update(decoded)
             else:
                 response.update({"is_valid":False, "error": "Wrong Token Type"})
         except jwt.ExpiredSignatureError:
-            response.update({"is_valid":False, "error": "Partial token has expired"})
+            response.update({"is_valid":False, "error": f"{label.capitalize()} token has expired"})
         except jwt.InvalidTokenError:
-            response.update({"is_valid":False, "error": "Invalid partial token"})
+            response.update({"is_valid":False, "error": f"Invalid {label} token"})
         return response
 
+    def validate_partial_jwt(self, token):
+        """Validate a partial token used for 2FA flow."""
+        return self._validate_jwt(token, "partial", "partial")
+
     def validate_access_jwt(self, token):
         """Validate an access token."""
-        response = dict()
-        try:
-            decoded = jwt.decode(token, SECRET_KEY, algorithms=[JWT_ALGORITHM])
-            if decoded.get("type") == "access":
-                response.update({"is_valid":True})
-                response.update(decoded)
-            else:
-                response.update({"is_valid":False, "error": "Wrong Token Type"})
-        except jwt.ExpiredSignatureError:
-            response.update({"is_valid":False, "error": "Access token has expired"})
-        except jwt.InvalidTokenError:
-            response.update({"is_valid":False, "error": "Invalid access token"})
-        return response
+        return self._validate_jwt(token, "access", "access")
 
     def validate_email_verify_jwt(self, token):
         """Validate an email verification token."""
-        response = dict()
-        try:
-            decoded = jwt.decode(token, SECRET_KEY, algorithms=[JWT_ALGORITHM])
-            if decoded.get("type") == "email":
-                response.update({"is_valid":True})
-                response.update(decoded)
-            else:
-                response.update({"is_valid":False, "error": "Wrong Token Type"})
-        except jwt.ExpiredSignatureError:
-            response.update({"is_valid":False, "error": "Email verification token has expired"})
-        except jwt.InvalidTokenError:
-            response.update({"is_valid":False, "error": "Invalid email verification token"})
-        return response
+        return self._validate_jwt(token, "email", "email verification")
+
+    def validate_refresh_claims(self, token):
+        """Validate a refresh token without issuing anything."""
+        return self._validate_jwt(token, "refresh", "refresh")
 
     def validate_refresh_jwt(self, token):
         """Validate a refresh token and generate a new access token if valid."""
-        response = dict()
-        try:
-            decoded = jwt.decode(token, SECRET_KEY, algorithms=[JWT_ALGORITHM])
-            if decoded.get("type") == "refresh":
-                new_access_jwt = self.generate_access_jwt(decoded)
-                response.update({"is_valid": True, "access_token": new_access_jwt})
-            else:
-                response.update({"is_valid":False, "error": "Wrong Token Type"})
-        except jwt.ExpiredSignatureError:
-            response.update({"is_valid": False, "error": "Refresh token has expired"})
-        except jwt.InvalidTokenError:
-            response.update({"is_valid": False, "error": "Invalid refresh token"})
+        response = self.validate_refresh_claims(token)
+        if response.get("is_valid"):
+            claims = {k: v for k, v in response.items() if k not in ("is_valid", "jti")}
+            response["access_token"] = self.generate_access_jwt(claims)
         return response
+
+    def refresh_to_access(self, token):
+        """
+        Validate a refresh token and issue an access token. A successful result is
+        reused for REFRESH_COALESCE_WINDOW_SECONDS, so duplicate refreshes of one token
+        get the same access token. Minting is synchronous and never yields to the event
+        loop, so there are no concurrent in-flight calls to merge; the window is the
+        whole mechanism.
+        """
+        key = token_digest(token)
+        response = self.recent_refreshes.get(key)
+        if response is None:
+            response = self.validate_refresh_jwt(token)
+            if response.get("is_valid"):
+                self.recent_refreshes.set(key, response, time.time() + REFRESH_COALESCE_WINDOW_SECONDS)
+        return dict(response)
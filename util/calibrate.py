@@ -0,0 +1,73 @@
+"""
+Argon2 parameter calibration.
+
+Benchmarks this machine and picks Argon2 time/memory/parallelism so a single
+verify lands close to (without exceeding) a target latency. Prints settings
+that can be pinned in the environment (see ARGON2_* in app/settings.py).
+
+    python -m util.calibrate --target-ms 100 --max-memory-mib 64
+"""
+import argparse
+import os
+import statistics
+import time
+from argon2 import PasswordHasher
+
+SAMPLE_PASSWORD = "Calibrate123"
+
+def measure_verify_ms(time_cost: int, memory_cost: int, parallelism: int, rounds: int = 5) -> float:
+    """Median latency of one verify with the given parameters, in milliseconds."""
+    ph = PasswordHasher(time_cost=time_cost, memory_cost=memory_cost, parallelism=parallelism)
+    hashed = ph.hash(SAMPLE_PASSWORD)
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        ph.verify(hashed, SAMPLE_PASSWORD)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+def calibrate(target_ms: float, max_memory_mib: int, parallelism: int, rounds: int = 5) -> dict:
+    """
+    Pick the strongest parameters that verify within target_ms.
+    Memory is preferred over iterations: start at the memory cap with one pass,
+    halve memory until under target, then add passes while still under target.
+    """
+    memory_cost = max_memory_mib * 1024
+    min_memory_cost = 8 * parallelism
+
+    time_cost = 1
+    elapsed = measure_verify_ms(time_cost, memory_cost, parallelism, rounds)
+    while elapsed > target_ms and memory_cost // 2 >= min_memory_cost:
+        memory_cost //= 2
+        elapsed = measure_verify_ms(time_cost, memory_cost, parallelism, rounds)
+
+    while True:
+        candidate = measure_verify_ms(time_cost + 1, memory_cost, parallelism, rounds)
+        if candidate > target_ms:
+            break
+        time_cost += 1
+        elapsed = candidate
+
+    return {
+        "time_cost": time_cost,
+        "memory_cost": memory_cost,
+        "parallelism": parallelism,
+        "verify_ms": elapsed,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibrate Argon2 cost parameters for this machine.")
+    parser.add_argument("--target-ms", type=float, default=100, help="Target verify latency in milliseconds")
+    parser.add_argument("--max-memory-mib", type=int, default=64, help="Upper bound on memory per hash")
+    parser.add_argument("--parallelism", type=int, default=min(os.cpu_count() or 1, 4))
+    parser.add_argument("--rounds", type=int, default=5, help="Verifications measured per candidate")
+    args = parser.parse_args()
+
+    result = calibrate(args.target_ms, args.max_memory_mib, args.parallelism, args.rounds)
+    print(f"# verify median: {result['verify_ms']:.1f} ms (target {args.target_ms:.0f} ms)")
+    print(f"ARGON2_TIME_COST={result['time_cost']}")
+    print(f"ARGON2_MEMORY_COST={result['memory_cost']}")
+    print(f"ARGON2_PARALLELISM={result['parallelism']}")
+
+if __name__ == "__main__":
+    main()
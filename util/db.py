@@ -1,22 +1,261 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Dict
+from sqlalchemy import event, exc
+from sqlalchemy.engine.default import CACHE_HIT
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 from sqlalchemy.ext.declarative import DeclarativeMeta
-from app.settings import DATABASE_URL
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from app.settings import (
+    DATABASE_URL,
+    DB_ECHO,
+    DB_POOL_SIZE,
+    DB_MAX_OVERFLOW,
+    DB_POOL_TIMEOUT,
+    DB_POOL_RECYCLE,
+    DB_POOL_PRE_PING,
+    DB_PREPARED_STATEMENT_CACHE_SIZE,
+    DB_QUERY_TIMINGS,
+    SQLITE_PERFORMANCE_MODE,
+    SQLITE_MMAP_SIZE,
+    SQLITE_CACHE_SIZE_KIB,
+    SQLITE_BUSY_TIMEOUT_MS,
+    SQLITE_SERIALIZE_WRITES,
+)
+
+logger = logging.getLogger("plankton-api")
 
 SQLALCHEMY_DATABASE_URL = DATABASE_URL
 
-engine = create_async_engine(SQLALCHEMY_DATABASE_URL, echo=True)
-SessionLocal = sessionmaker(bind=engine, class_=AsyncSession, autocommit=False, autoflush=False) # type: ignore
+#######################################
+# QUERY TIMINGS
+#######################################
 
-Base: DeclarativeMeta = declarative_base()
+class QueryTimings:
+    """
+    Per-query time split between SQLAlchemy and the database, keyed by the
+    `query_name` execution option (unlabelled statements are grouped together).
+
+    - compile: from execute() to the cursor call: cache lookup, compilation on a
+      cache miss, and parameter processing.
+    - execute: the cursor call itself, i.e. the database round trip.
+    Turning result rows into objects happens after both and is not included.
+    """
+    def __init__(self):
+        self.queries: Dict[str, dict] = {}
+
+    def record(self, name: str, compile_seconds: float, execute_seconds: float, cache_hit: bool):
+        query = self.queries.get(name)
+        if query is None:
+            query = self.queries[name] = {
+                "count": 0, "cache_hits": 0, "compile_seconds": 0.0, "execute_seconds": 0.0,
+            }
+        query["count"] += 1
+        query["cache_hits"] += cache_hit
+        query["compile_seconds"] += compile_seconds
+        query["execute_seconds"] += execute_seconds
+
+    def stats(self) -> Dict[str, dict]:
+        return {
+            name: {
+                "count": query["count"],
+                "cache_hits": query["cache_hits"],
+                "avg_compile_ms": query["compile_seconds"] / query["count"] * 1000,
+                "avg_execute_ms": query["execute_seconds"] / query["count"] * 1000,
+            }
+            for name, query in self.queries.items()
+        }
+
+query_timings = QueryTimings()
+
+def instrument_queries(target_engine, timings: QueryTimings = query_timings, enabled: bool = DB_QUERY_TIMINGS):
+    """Attach compile/execute timing events to an engine when DB_QUERY_TIMINGS is on."""
+    if not enabled:
+        return target_engine
+    sync_engine = target_engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_execute")
+    def _started(conn, clauseelement, multiparams, params, execution_options):
+        conn.info["query_started"] = time.perf_counter()
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _compiled(conn, cursor, statement, parameters, context, executemany):
+        conn.info["query_compiled"] = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _executed(conn, cursor, statement, parameters, context, executemany):
+        done = time.perf_counter()
+        compiled = conn.info.pop("query_compiled", done)
+        # Statements run outside execute() (e.g. DDL internals) have no start mark
+        started = conn.info.pop("query_started", compiled)
+        timings.record(
+            context.execution_options.get("query_name", "unlabelled"),
+            compiled - started,
+            done - compiled,
+            getattr(context, "cache_hit", None) is CACHE_HIT,
+        )
+
+    return target_engine
+
+#######################################
+# SQLITE
+#######################################
+
+def apply_sqlite_profile(target_engine):
+    """Set the SQLite performance pragmas on every new connection of an engine."""
+    pragmas = (
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",  # fsync on checkpoint instead of on every commit
+        f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}",
+        f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KIB}",  # negative means KiB rather than pages
+        f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}",
+        "PRAGMA temp_store=MEMORY",
+    )
+
+    @event.listens_for(target_engine.sync_engine, "connect")
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+    return target_engine
 
-async def create_db_tables():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+class SingleWriter:
+    """
+    In-process FIFO queue for write transactions. SQLite allows one writer at a
+    time; letting requests take turns here avoids piling up on the file lock and
+    failing with "database is locked". A no-op when disabled (e.g. on Postgres).
+    """
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        self._lock = asyncio.Lock()
 
-async def get_db():
-    async with SessionLocal() as session: # type: ignore
+        # Metrics
+        self.writes = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold the writer slot from the first write statement until commit."""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        async with self._lock:
+            waited = time.perf_counter() - start
+            self.writes += 1
+            self.total_wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+            yield
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "writes": self.writes,
+            "avg_wait_seconds": self.total_wait_seconds / self.writes if self.writes else 0.0,
+            "max_wait_seconds": self.max_wait_seconds,
+        }
+
+#######################################
+# CONNECTION POOL
+#######################################
+
+class PoolMetrics:
+    """Counters for connection checkouts, shared across pool re-creations."""
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long callers wait for a connection and how often they time out."""
+    metrics: PoolMetrics
+
+    def connect(self):
+        start = time.perf_counter()
         try:
-            yield session
+            return super().connect()
+        except exc.TimeoutError:
+            self.metrics.timeouts += 1
+            raise
         finally:
-            await session.close()
+            waited = time.perf_counter() - start
+            self.metrics.checkouts += 1
+            self.metrics.total_wait_seconds += waited
+            self.metrics.max_wait_seconds = max(self.metrics.max_wait_seconds, waited)
+
+def create_engine(url: str):
+    """Create an async engine using the configured, instrumented connection pool."""
+    if url.startswith("sqlite") and (":memory:" in url or url.rstrip("/").endswith(":")):
+        # In-memory SQLite needs its single static connection
+        target_engine = create_async_engine(url, echo=DB_ECHO)
+    else:
+        connect_args = {}
+        if url.startswith("postgresql+asyncpg"):
+            # Hot statements are prepared once per connection and reused by name
+            connect_args["prepared_statement_cache_size"] = DB_PREPARED_STATEMENT_CACHE_SIZE
+
+        # Each engine gets its own metrics; pool re-creation keeps the class and so the metrics
+        pool_class = type("InstrumentedPool", (InstrumentedPool,), {"metrics": PoolMetrics()})
+        target_engine = create_async_engine(
+            url,
+            echo=DB_ECHO,
+            poolclass=pool_class,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+            pool_pre_ping=DB_POOL_PRE_PING,
+            connect_args=connect_args,
+        )
+
+    if url.startswith("sqlite") and SQLITE_PERFORMANCE_MODE:
+        apply_sqlite_profile(target_engine)
+    return instrument_queries(target_engine)
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL)
+SessionLocal = sessionmaker(bind=engine, class_=AsyncSession, autocommit=False, autoflush=False) # type: ignore
+# Write transactions on the primary take turns when it is SQLite running the performance profile
+single_writer = SingleWriter(
+    enabled=engine.dialect.name == "sqlite" and SQLITE_PERFORMANCE_MODE and SQLITE_SERIALIZE_WRITES
+)
+
+def query_stats() -> dict:
+    """Per-query timings (empty unless DB_QUERY_TIMINGS is on) and statement cache settings."""
+    stats = {"queries": query_timings.stats()}
+    if engine.dialect.driver == "asyncpg":
+        stats["prepared_statement_cache_size"] = DB_PREPARED_STATEMENT_CACHE_SIZE
+    return stats
+
+def pool_stats(target_engine=None) -> dict:
+    """Snapshot of connection pool usage for an engine (the primary by default)."""
+    pool = (target_engine if target_engine is not None else engine).pool
+    if not isinstance(pool, InstrumentedPool):
+        return {}
+    metrics = pool.metrics
+    return {
+        "pool_size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": pool.overflow(),
+        "checkouts": metrics.checkouts,
+        "checkout_timeouts": metrics.timeouts,
+        "avg_wait_seconds": metrics.total_wait_seconds / metrics.checkouts if metrics.checkouts else 0.0,
+        "max_wait_seconds": metrics.max_wait_seconds,
+    }
+
+Base: DeclarativeMeta = declarative_base()
+
+def dialect_insert(table):
+    """INSERT construct for the primary database, with ON CONFLICT support (SQLite/Postgres)"""
+    if engine.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(table)
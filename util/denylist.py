@@ -0,0 +1,143 @@
+import hashlib
+import math
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models import RevokedToken
+from util.db import single_writer
+from app.settings import (
+    REVOCATION_FILTER_CAPACITY,
+    REVOCATION_FILTER_ERROR_RATE,
+    REVOCATION_SYNC_OVERLAP_SECONDS,
+    REVOCATION_RELOAD_SECONDS,
+)
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over strings.
+    `might_contain` never returns a false negative, and returns a false positive
+    with roughly `error_rate` probability while at or under `capacity` items.
+    """
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity = max(1, capacity)
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, item: str):
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def might_contain(self, item: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+
+class RevocationList:
+    """
+    Revoked refresh tokens, persisted in `revoked_tokens` and mirrored in an in-process Bloom filter.
+    Almost every refresh is answered by the filter alone; only possible hits are confirmed in the DB.
+
+    `revoked_at` is stamped by the revoking worker before it commits, so a row can
+    become visible with a timestamp older than the last sync point. Each sync re-reads
+    an overlap window behind that point, and the filter is rebuilt periodically to
+    catch anything later still. Until the first load succeeds every check goes to the DB.
+    """
+    def __init__(
+        self,
+        capacity: int = REVOCATION_FILTER_CAPACITY,
+        error_rate: float = REVOCATION_FILTER_ERROR_RATE,
+        overlap: float = REVOCATION_SYNC_OVERLAP_SECONDS,
+        reload_interval: float = REVOCATION_RELOAD_SECONDS,
+    ):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.overlap = timedelta(seconds=overlap)
+        self.reload_interval = reload_interval
+        self.filter = BloomFilter(capacity, error_rate)
+        self.synced_until: Optional[datetime] = None
+        self.loaded_at: Optional[float] = None
+
+        # Metrics
+        self.filter_negatives = 0
+        self.db_confirmations = 0
+
+    async def load(self, db: AsyncSession):
+        """Rebuild the filter from every unexpired revocation."""
+        now = datetime.now(timezone.utc)
+        result = await db.execute(
+            select(RevokedToken.jti, RevokedToken.revoked_at).where(RevokedToken.expires_at > now)
+        )
+        rows = result.all()
+        # Grow the filter if revocations outnumber the configured capacity
+        self.filter = BloomFilter(max(self.capacity, 2 * len(rows)), self.error_rate)
+        for jti, _ in rows:
+            self.filter.add(jti)
+        # Timestamps come back from the DB without tzinfo, so track the sync point the same way
+        self.synced_until = max((revoked_at for _, revoked_at in rows), default=now.replace(tzinfo=None))
+        self.loaded_at = time.monotonic()
+
+    @property
+    def loaded(self) -> bool:
+        return self.loaded_at is not None
+
+    async def sync(self, db: AsyncSession):
+        """Add revocations made since the last load/sync (e.g. by other workers)."""
+        # Load if the last attempt failed, rebuild periodically, and rebuild once the
+        # filter is over capacity and its error rate starts climbing
+        if (
+            not self.loaded
+            or time.monotonic() - self.loaded_at >= self.reload_interval
+            or self.filter.count > self.filter.capacity
+        ):
+            await self.load(db)
+            return
+        result = await db.execute(
+            select(RevokedToken.jti, RevokedToken.revoked_at)
+            .where(RevokedToken.revoked_at >= self.synced_until - self.overlap)
+        )
+        for jti, revoked_at in result.all():
+            # The overlap returns rows seen before; don't count them twice
+            if not self.filter.might_contain(jti):
+                self.filter.add(jti)
+            self.synced_until = max(self.synced_until, revoked_at)
+
+    async def is_revoked(self, db: AsyncSession, jti: str) -> bool:
+        # Fail closed: without a loaded filter a negative means nothing
+        if self.loaded and not self.filter.might_contain(jti):
+            self.filter_negatives += 1
+            return False
+        self.db_confirmations += 1
+        result = await db.execute(select(RevokedToken.jti).where(RevokedToken.jti == jti))
+        return result.first() is not None
+
+    async def revoke(self, db: AsyncSession, jti: str, expires_at: datetime, user_id=None):
+        """Persist a revocation and add it to the local filter."""
+        async with single_writer.slot():
+            db.add(RevokedToken(jti=jti, user_id=user_id, expires_at=expires_at))
+            try:
+                await db.commit()
+            except IntegrityError:
+                # Already revoked
+                await db.rollback()
+        self.filter.add(jti)
+
+    def stats(self) -> dict:
+        """Snapshot of revocation metrics."""
+        return {
+            "filter_items": self.filter.count,
+            "filter_bits": self.filter.size,
+            "filter_negatives": self.filter_negatives,
+            "db_confirmations": self.db_confirmations,
+        }
@@ -0,0 +1,350 @@
+"""
+In-process outbound email queue.
+
+Handlers enqueue a message (as built by util.emailer) and return immediately.
+Worker tasks drain the queue, group whatever is waiting into batches, and hand
+each batch to a transport, retrying failed batches with exponential backoff.
+
+Transports, selected with EMAIL_TRANSPORT:
+- "resend": the Resend batch endpoint over a pooled keep-alive HTTP client (the default)
+- "smtp": any SMTP server at SMTP_HOST:SMTP_PORT, e.g. a local catcher like MailHog
+- "memory": keeps messages in a list; for tests and local development
+- "none": discards messages with a warning. Also what "resend" falls back to when
+  RESEND_API_KEY is unset and no email feature (REQUIRE_USERS_VERIFIED, DEFAULT_2FA_ON)
+  is enabled; with one enabled, a missing key fails startup instead
+
+Transports raise PermanentEmailError when the provider rejects a message for good
+(e.g. a bad address). Those messages are dropped on their own and the rest of their
+batch still goes out; any other error is treated as transient and the batch is
+retried. EmailAuthError, for credentials the provider refuses, is one of those: the
+messages are fine, so they wait for the key to be fixed instead of being dropped.
+
+The queue lives in memory, so messages still waiting when the process dies are lost.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+from abc import ABC, abstractmethod
+import random
+import smtplib
+from email.message import EmailMessage
+from typing import List, Optional, Tuple
+import httpx
+from app.settings import (
+    RESEND_API_KEY,
+    RESEND_API_URL,
+    EMAIL_HTTP_TIMEOUT_SECONDS,
+    EMAIL_HTTP_CONNECT_TIMEOUT_SECONDS,
+    EMAIL_HTTP_MAX_CONCURRENCY,
+    EMAIL_HTTP_KEEPALIVE_SECONDS,
+    EMAIL_TRANSPORT,
+    EMAIL_QUEUE_MAX_SIZE,
+    EMAIL_QUEUE_WORKERS,
+    EMAIL_BATCH_SIZE,
+    EMAIL_BATCH_WAIT_SECONDS,
+    EMAIL_MAX_RETRIES,
+    EMAIL_RETRY_BASE_SECONDS,
+    SMTP_HOST,
+    SMTP_PORT,
+    REQUIRE_USERS_VERIFIED,
+    DEFAULT_2FA_ON,
+)
+
+logger = logging.getLogger("plankton-api")
+
+#######################################
+# TRANSPORTS
+#######################################
+
+class PermanentEmailError(Exception):
+    """
+    The provider refused the batch and sending it again unchanged won't help.
+    `rejected` lists the refused messages when the transport knows them (the others
+    were delivered); None means one or more unknown messages in the batch.
+    """
+    def __init__(self, message: str, rejected: Optional[List[dict]] = None):
+        super().__init__(message)
+        self.rejected = rejected
+
+
+class EmailAuthError(Exception):
+    """The provider refused our credentials. Nothing was sent; the batch may be retried."""
+
+
+class EmailTransport(ABC):
+    """
+    Delivers a batch of messages. PermanentEmailError means some messages can't be
+    delivered; any other exception means the whole batch may be retried.
+    """
+    @abstractmethod
+    async def send_batch(self, messages: List[dict]):
+        """Send every message in the batch."""
+
+    async def close(self):
+        pass
+
+
+class ResendTransport(EmailTransport):
+    """
+    Calls the Resend batch endpoint with one shared async HTTP client, so sends reuse
+    warm keep-alive connections instead of paying DNS, TCP and TLS setup every time.
+
+    Each request carries an Idempotency-Key derived from the batch's content, so a
+    retry of a batch the server accepted before timing out isn't delivered twice.
+    429, 408, 409 (a concurrent request with the same key) and 5xx responses are
+    transient. 401 and 403 raise EmailAuthError: a bad or rotating key is no reason to
+    drop the messages. Other 4xx responses are permanent rejections.
+    """
+    def __init__(
+        self,
+        api_key: Optional[str] = RESEND_API_KEY,
+        base_url: str = RESEND_API_URL,
+        max_concurrency: int = EMAIL_HTTP_MAX_CONCURRENCY,
+        client: Optional[httpx.AsyncClient] = None,
+    ):
+        if client is None and not api_key:
+            raise RuntimeError(
+                "EMAIL_TRANSPORT=resend requires RESEND_API_KEY "
+                "(use EMAIL_TRANSPORT=memory if this deployment sends no email)"
+            )
+        self.client = client or httpx.AsyncClient(
+            base_url=base_url,
+            headers={"Authorization": f"Bearer {api_key}"},
+            timeout=httpx.Timeout(EMAIL_HTTP_TIMEOUT_SECONDS, connect=EMAIL_HTTP_CONNECT_TIMEOUT_SECONDS),
+            limits=httpx.Limits(
+                max_connections=max_concurrency,
+                max_keepalive_connections=max_concurrency,
+                keepalive_expiry=EMAIL_HTTP_KEEPALIVE_SECONDS,
+            ),
+        )
+        self._concurrency = asyncio.Semaphore(max_concurrency)
+
+    @staticmethod
+    def idempotency_key(messages: List[dict]) -> str:
+        body = json.dumps(messages, sort_keys=True, separators=(",", ":"))
+        return "batch-" + hashlib.sha256(body.encode()).hexdigest()
+
+    async def send_batch(self, messages: List[dict]):
+        async with self._concurrency:
+            response = await self.client.post(
+                "/emails/batch",
+                json=messages,
+                headers={"Idempotency-Key": self.idempotency_key(messages)},
+            )
+        code = response.status_code
+        if code < 400 or code in (408, 409, 429) or code >= 500:
+            response.raise_for_status()
+            return
+        error = f"Resend rejected the batch with {code}: {response.text[:200]}"
+        if code in (401, 403):
+            # The key, not any one message, is the problem
+            raise EmailAuthError(error)
+        raise PermanentEmailError(error)
+
+    async def close(self):
+        await self.client.aclose()
+
+
+class MemoryTransport(EmailTransport):
+    def __init__(self):
+        self.sent: List[dict] = []
+
+    async def send_batch(self, messages: List[dict]):
+        self.sent.extend(messages)
+
+
+class NullTransport(EmailTransport):
+    """Sends nothing. For deployments that don't use email at all."""
+    async def send_batch(self, messages: List[dict]):
+        for message in messages:
+            logger.warning(f"No email transport configured, discarding email to {message.get('to')}")
+
+
+class SMTPTransport(EmailTransport):
+    """Sends each batch over one SMTP connection."""
+    def __init__(self, host: str = SMTP_HOST, port: int = SMTP_PORT):
+        self.host = host
+        self.port = port
+
+    def _send(self, messages: List[dict]):
+        rejected = []
+        with smtplib.SMTP(self.host, self.port, timeout=10) as smtp:
+            for params in messages:
+                message = EmailMessage()
+                message["From"] = params["from"]
+                message["To"] = ", ".join(params["to"])
+                message["Subject"] = params["subject"]
+                message.set_content(params.get("text") or "This message requires an HTML-capable email client.")
+                if params.get("html"):
+                    message.add_alternative(params["html"], subtype="html")
+                try:
+                    smtp.send_message(message)
+                except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused) as e:
+                    # Refused by the server: skip this message, keep sending the rest
+                    rejected.append(params)
+                    error = e
+                except smtplib.SMTPDataError as e:
+                    if e.smtp_code < 500:
+                        raise
+                    rejected.append(params)
+                    error = e
+        if rejected:
+            raise PermanentEmailError(f"SMTP server refused {len(rejected)} message(s): {error}", rejected=rejected)
+
+    async def send_batch(self, messages: List[dict]):
+        await asyncio.to_thread(self._send, messages)
+
+
+async def send_isolating_rejects(transport: EmailTransport, messages: List[dict]) -> List[Tuple[dict, Exception]]:
+    """
+    Send a batch, returning the messages the provider rejected for good with their
+    errors. When the transport can't say which messages it rejected, the batch is
+    split in halves until the bad ones are isolated, so they don't take the rest of
+    the batch down with them. Transient errors propagate.
+    """
+    try:
+        await transport.send_batch(messages)
+        return []
+    except PermanentEmailError as e:
+        if e.rejected is not None:
+            return [(message, e) for message in e.rejected]
+        if len(messages) == 1:
+            return [(messages[0], e)]
+        middle = len(messages) // 2
+        return (
+            await send_isolating_rejects(transport, messages[:middle])
+            + await send_isolating_rejects(transport, messages[middle:])
+        )
+
+
+def create_email_transport(kind: str = EMAIL_TRANSPORT) -> EmailTransport:
+    if kind == "resend":
+        if not RESEND_API_KEY:
+            if REQUIRE_USERS_VERIFIED or DEFAULT_2FA_ON:
+                raise RuntimeError(
+                    "RESEND_API_KEY is required when REQUIRE_USERS_VERIFIED or DEFAULT_2FA_ON is set"
+                )
+            logger.warning("RESEND_API_KEY is not set, emails will be discarded")
+            return NullTransport()
+        return ResendTransport()
+    if kind == "smtp":
+        return SMTPTransport()
+    if kind == "memory":
+        return MemoryTransport()
+    if kind == "none":
+        return NullTransport()
+    raise ValueError(f"Unknown EMAIL_TRANSPORT: {kind}")
+
+#######################################
+# QUEUE
+#######################################
+
+class EmailQueue:
+    def __init__(
+        self,
+        transport: EmailTransport,
+        max_size: int = EMAIL_QUEUE_MAX_SIZE,
+        workers: int = EMAIL_QUEUE_WORKERS,
+        batch_size: int = EMAIL_BATCH_SIZE,
+        batch_wait: float = EMAIL_BATCH_WAIT_SECONDS,
+        max_retries: int = EMAIL_MAX_RETRIES,
+        retry_base: float = EMAIL_RETRY_BASE_SECONDS,
+    ):
+        self.transport = transport
+        self.workers = workers
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.max_retries = max_retries
+        self.retry_base = retry_base
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_size)
+        self._tasks: List[asyncio.Task] = []
+
+        # Metrics
+        self.enqueued = 0
+        self.dropped = 0
+        self.sent = 0
+        self.failed = 0
+        self.batches = 0
+        self.retries = 0
+
+    def enqueue(self, message: dict) -> bool:
+        """Queue a message for delivery without waiting. Returns False if the queue is full."""
+        try:
+            self._queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.error(f"Email queue full, dropped message to {message.get('to')}")
+            return False
+        self.enqueued += 1
+        return True
+
+    async def _next_batch(self) -> List[dict]:
+        batch = [await self._queue.get()]
+        # Give messages arriving right behind the first one a moment to join the batch
+        deadline = asyncio.get_running_loop().time() + self.batch_wait
+        while len(batch) < self.batch_size:
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _deliver(self, batch: List[dict]):
+        for attempt in range(self.max_retries + 1):
+            try:
+                rejected = await send_isolating_rejects(self.transport, batch)
+            except Exception as e:
+                if attempt == self.max_retries:
+                    self.failed += len(batch)
+                    logger.error(f"Giving up on {len(batch)} emails after {attempt + 1} attempts: {e}")
+                    return
+                self.retries += 1
+                delay = self.retry_base * 2 ** attempt
+                await asyncio.sleep(delay + random.uniform(0, delay / 2))
+                continue
+            # Rejected messages won't go through on a retry; drop just those
+            for message, e in rejected:
+                logger.error(f"Email to {message.get('to')} rejected: {e}")
+            self.failed += len(rejected)
+            self.sent += len(batch) - len(rejected)
+            return
+
+    async def _worker(self):
+        while True:
+            batch = await self._next_batch()
+            self.batches += 1
+            try:
+                await self._deliver(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self, drain_timeout: Optional[float] = 5.0):
+        """Give queued messages up to drain_timeout seconds to go out, then stop the workers."""
+        try:
+            await asyncio.wait_for(self._queue.join(), drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Email queue stopped with {self._queue.qsize()} messages unsent")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self.transport.close()
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "enqueued": self.enqueued,
+            "dropped": self.dropped,
+            "sent": self.sent,
+            "failed": self.failed,
+            "batches": self.batches,
+            "retries": self.retries,
+        }
@@ -0,0 +1,151 @@
+"""
+Ephemeral key-value storage for short-lived secrets (2FA codes and similar).
+
+Values expire after a TTL and are never written to the primary database.
+Two backends are available, selected with EPHEMERAL_STORE:
+
+- "memory": in-process, sharded dicts with a timing wheel for expiry. Fast, but only
+  correct when a single worker process serves every request.
+- "redis": any Redis-compatible server at EPHEMERAL_REDIS_URL (requires `pip install redis`).
+  Tests can pass a local stand-in client (e.g. fakeredis) to RedisStore directly.
+"""
+import time
+from abc import ABC, abstractmethod
+from typing import List, Optional, Set, Dict, Tuple
+from app.settings import EPHEMERAL_STORE, EPHEMERAL_REDIS_URL
+
+class EphemeralStore(ABC):
+    """Interface shared by the ephemeral store backends."""
+    @abstractmethod
+    async def set(self, key: str, value: str, ttl: int):
+        """Store value under key for ttl seconds, replacing any previous value."""
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[str]:
+        """Return the value under key, or None if missing or expired."""
+
+    @abstractmethod
+    async def consume(self, key: str, expected: str) -> bool:
+        """Atomically delete key if it currently holds `expected`. Returns whether it did."""
+
+    @abstractmethod
+    async def delete(self, key: str):
+        """Remove key if present."""
+
+    async def close(self):
+        pass
+
+
+class MemoryStore(EphemeralStore):
+    """
+    In-process store. Keys are spread over several dicts to keep each one small, and
+    expiry is tracked in a timing wheel of one-second slots that is advanced lazily on
+    every operation, so expired entries are reclaimed without a background task.
+    """
+    def __init__(self, shards: int = 16, wheel_size: int = 3600):
+        self._shards: List[Dict[str, Tuple[str, float]]] = [dict() for _ in range(shards)]
+        self._wheel: List[Set[str]] = [set() for _ in range(wheel_size)]
+        self._tick = int(time.monotonic())
+
+    def _shard(self, key: str) -> Dict[str, Tuple[str, float]]:
+        return self._shards[hash(key) % len(self._shards)]
+
+    def _advance(self, now: float):
+        """Expire every key whose slot the wheel has passed since the last call."""
+        target = int(now)
+        # Never walk more than one full turn
+        start = max(self._tick + 1, target - len(self._wheel) + 1)
+        for tick in range(start, target + 1):
+            slot = self._wheel[tick % len(self._wheel)]
+            if not slot:
+                continue
+            for key in list(slot):
+                shard = self._shard(key)
+                entry = shard.get(key)
+                # Long TTLs share slots with later turns of the wheel; keep those
+                if entry is None or entry[1] <= now:
+                    shard.pop(key, None)
+                    slot.discard(key)
+        self._tick = max(self._tick, target)
+
+    def _live(self, key: str, now: float) -> Optional[Tuple[str, float]]:
+        entry = self._shard(key).get(key)
+        if entry is None or entry[1] <= now:
+            return None
+        return entry
+
+    async def set(self, key: str, value: str, ttl: int):
+        now = time.monotonic()
+        self._advance(now)
+        expires_at = now + ttl
+        self._shard(key)[key] = (value, expires_at)
+        self._wheel[int(expires_at + 1) % len(self._wheel)].add(key)
+
+    async def get(self, key: str) -> Optional[str]:
+        now = time.monotonic()
+        self._advance(now)
+        entry = self._live(key, now)
+        return entry[0] if entry else None
+
+    async def consume(self, key: str, expected: str) -> bool:
+        now = time.monotonic()
+        self._advance(now)
+        entry = self._live(key, now)
+        if entry is None or entry[0] != expected:
+            return False
+        del self._shard(key)[key]
+        return True
+
+    async def delete(self, key: str):
+        self._shard(key).pop(key, None)
+
+    def __len__(self):
+        return sum(len(shard) for shard in self._shards)
+
+
+# Compare-and-delete in one server-side step
+_CONSUME_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+class RedisStore(EphemeralStore):
+    """Store backed by a Redis-compatible server, shared by every worker."""
+    def __init__(self, client):
+        self.client = client
+
+    @classmethod
+    def from_url(cls, url: str) -> "RedisStore":
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError(
+                "EPHEMERAL_STORE=redis requires the redis package, which isn't in requirements.txt "
+                "(pip install 'redis>=5')"
+            )
+        return cls(redis.from_url(url, decode_responses=True))
+
+    async def set(self, key: str, value: str, ttl: int):
+        await self.client.set(key, value, ex=ttl)
+
+    async def get(self, key: str) -> Optional[str]:
+        return await self.client.get(key)
+
+    async def consume(self, key: str, expected: str) -> bool:
+        return bool(await self.client.eval(_CONSUME_SCRIPT, 1, key, expected))
+
+    async def delete(self, key: str):
+        await self.client.delete(key)
+
+    async def close(self):
+        await self.client.aclose()
+
+
+def create_ephemeral_store(backend: str = EPHEMERAL_STORE) -> EphemeralStore:
+    if backend == "memory":
+        return MemoryStore()
+    if backend == "redis":
+        return RedisStore.from_url(EPHEMERAL_REDIS_URL)
+    raise ValueError(f"Unknown EPHEMERAL_STORE: {backend}")
@@ -1,15 +1,32 @@
 from fastapi import FastAPI, HTTPException, status, Request, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.future import select
-from app.models import User, Profile
+from app.models import TwoFactorAuthCode, RevokedToken, EmailOutbox
 from contextlib import asynccontextmanager
-from util.auth import Auther
-from util.db import create_db_tables, get_db
+from util.auth import Auther, create_hash_executor, hasher
+from util.admission import HashAdmission
+from util.keys import KeyRing
+from util.db import SessionLocal
+from util.replicas import replicas
+from util.schema import create_db_tables
+from util.sessions import get_db, get_read_db
+from util.denylist import RevocationList
+from util.ephemeral import EphemeralStore, create_ephemeral_store
+from util.lookups import cached_user_status_by_id
+from util.sweeper import ExpiredRowSweeper
+from util.email_queue import EmailQueue, create_email_transport
+from util.outbox import OutboxRelay
+import asyncio
 import json
 import uuid
 import logging
+from datetime import date, datetime
 from fastapi.responses import JSONResponse
-from app.settings import REQUIRE_USERS_VERIFIED
+from pydantic import BaseModel
+try:
+    import orjson
+except ImportError:  # optional, see CustomJSONResponse
+    orjson = None
+from app.settings import REQUIRE_USERS_VERIFIED, REVOCATION_SYNC_SECONDS, ACCESS_TOKEN_VERIFIED_CLAIM
 
 # Configure central logger
 logger = logging.getLogger("plankton-api")
@@ -18,18 +35,36 @@ logger = logging.getLogger("plankton-api")
 # JSON HANDLING
 #######################################
 
-# Custom JSON encoder to handle UUID objects
+# Custom JSON encoder to handle UUID and datetime objects
 class UUIDEncoder(json.JSONEncoder):
     def default(self, obj):
         if isinstance(obj, uuid.UUID):
             # Return a string representation of the UUID
             return str(obj)
+        if isinstance(obj, (datetime, date)):
+            value = obj.isoformat()
+            # Write UTC as "Z", like pydantic and orjson do
+            return value[:-6] + "Z" if value.endswith("+00:00") else value
         return super().default(obj)
 
-# Custom JSONResponse class that uses our encoder
+# Custom JSONResponse class that serializes in a single pass
 class CustomJSONResponse(JSONResponse):
-    """Custom JSON response that properly serializes UUIDs."""
+    """
+    JSON response that writes bytes straight from its content.
+
+    Pydantic models are dumped by pydantic-core (`model_dump_json`), which handles
+    UUIDs and datetimes natively. Handlers return `CustomJSONResponse(model)` rather
+    than the bare model, so FastAPI neither re-validates it against the route's
+    response_model nor runs it through jsonable_encoder first. Other content uses
+    orjson when it's installed and the stdlib encoder otherwise; all three write UTC
+    datetimes with a "Z" suffix. Unlike the stdlib path (allow_nan=False, which
+    raises), orjson and pydantic write NaN and infinity as null.
+    """
     def render(self, content) -> bytes:
+        if isinstance(content, BaseModel):
+            return content.model_dump_json(by_alias=True).encode("utf-8")
+        if orjson is not None:
+            return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z)
         return json.dumps(
             content,
             ensure_ascii=False,
@@ -43,6 +78,16 @@ class CustomJSONResponse(JSONResponse):
 # APPLICATION LIFECYCLE
 #######################################
 
+async def sync_revocations(revocations: RevocationList):
+    """Periodically pick up refresh tokens revoked by other workers."""
+    while True:
+        await asyncio.sleep(REVOCATION_SYNC_SECONDS)
+        try:
+            async with SessionLocal() as db:
+                await revocations.sync(db)
+        except Exception as e:
+            logger.error(f"Revocation sync error: {e}", exc_info=True)
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
@@ -54,8 +99,10 @@ async def lifespan(app: FastAPI):
     
     # Initialize database
     try:
-        await create_db_tables()
-        logger.info("Database tables initialized successfully")
+        if await create_db_tables():
+            logger.info("Database tables initialized successfully")
+        else:
+            logger.info("Database schema up to date")
     except Exception as e:
         logger.error(f"Database initialization error: {e}", exc_info=True)
         # Continue startup even if database fails
@@ -63,17 +110,66 @@ async def lifespan(app: FastAPI):
     # Initialize authentication system
     try:
         logger.info("Initializing authentication helpers")
-        app.state.auther = Auther()
+        app.state.auther = Auther(
+            executor=create_hash_executor(),
+            admission=HashAdmission(memory_cost_kib=hasher.memory_cost),
+            keyring=KeyRing.from_settings(),
+        )
         logger.info("Authentication helpers initialized successfully")
     except Exception as e:
         logger.error(f"Failed to initialize authentication helpers: {str(e)}", exc_info=True)
         app.state.auther = None
     
+    # Start outbound email workers for mail that isn't kept in SQL (2FA codes in the ephemeral store)
+    try:
+        app.state.email_queue = EmailQueue(create_email_transport())
+        app.state.email_queue.start()
+        # Emails committed to the outbox (2FA codes, verification links) share its transport
+        app.state.outbox = OutboxRelay(app.state.email_queue.transport)
+        app.state.outbox.start()
+        logger.info("Email delivery initialized successfully")
+    except Exception as e:
+        logger.error(f"Failed to initialize email delivery: {str(e)}", exc_info=True)
+        app.state.email_queue = None
+        app.state.outbox = None
+
+    # Initialize ephemeral state store (2FA codes and other short-lived secrets)
+    app.state.ephemeral = create_ephemeral_store()
+
+    # Load revoked refresh tokens into memory
+    app.state.revocations = RevocationList()
+    try:
+        async with SessionLocal() as db:
+            await app.state.revocations.load(db)
+        logger.info("Token revocation list loaded successfully")
+    except Exception as e:
+        # sync_revocations retries the load; refreshes are checked against the DB until then
+        logger.error(f"Failed to load token revocation list, retrying on next sync: {str(e)}", exc_info=True)
+    revocation_sync = asyncio.create_task(sync_revocations(app.state.revocations))
+
+    # Periodically delete expired rows from short-lived tables
+    app.state.sweeper = ExpiredRowSweeper()
+    app.state.sweeper.register(TwoFactorAuthCode, TwoFactorAuthCode.expires_at)
+    app.state.sweeper.register(RevokedToken, RevokedToken.expires_at)
+    app.state.sweeper.register(EmailOutbox, EmailOutbox.delivered_at)  # delivered outbox rows
+    app.state.sweeper.register(EmailOutbox, EmailOutbox.failed_at)  # outbox rows the relay gave up on
+    app.state.sweeper.start()
+    
     # Yield control back to FastAPI
     yield
     
     # Shutdown operations
     logger.info("Application shutdown initiated")
+    revocation_sync.cancel()
+    await app.state.sweeper.stop()
+    if app.state.outbox is not None:
+        await app.state.outbox.stop()
+    if app.state.email_queue is not None:
+        await app.state.email_queue.stop()
+    await app.state.ephemeral.close()
+    await replicas.dispose()
+    if app.state.auther is not None:
+        app.state.auther.shutdown()
     logger.info("Shutting down application")
 
 #######################################
@@ -90,6 +186,34 @@ def get_auther(request: Request) -> Auther:
         )
     return auther
 
+def get_revocations(request: Request) -> RevocationList:
+    """Dependency to get the refresh-token revocation list from app state"""
+    return request.app.state.revocations
+
+def get_ephemeral_store(request: Request) -> EphemeralStore:
+    """Dependency to get the ephemeral key-value store from app state"""
+    return request.app.state.ephemeral
+
+def get_email_queue(request: Request) -> EmailQueue:
+    """Dependency to get the outbound email queue from app state"""
+    email_queue = request.app.state.email_queue
+    if email_queue is None:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Email delivery is not initialized"
+        )
+    return email_queue
+
+def get_outbox_relay(request: Request) -> OutboxRelay:
+    """Dependency to get the email outbox relay from app state"""
+    outbox = request.app.state.outbox
+    if outbox is None:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Email delivery is not initialized"
+        )
+    return outbox
+
 def header_to_token(request: Request):
     """Extract token from Authorization header"""
     auth_header = request.headers.get("Authorization")
@@ -106,10 +230,17 @@ def header_to_token(request: Request):
 # TOKEN VALIDATION AND USER CHECKS
 #######################################
 
-async def access_token_header_to_user_id(request: Request, db: AsyncSession = Depends(get_db), verify_user: bool = REQUIRE_USERS_VERIFIED):
+async def access_token_header_to_user_id(
+    request: Request,
+    db: AsyncSession = Depends(get_read_db),
+    verify_user: bool = REQUIRE_USERS_VERIFIED,
+    primary: AsyncSession = Depends(get_db),
+):
     """
     Validate access token and return user ID
-    Optional verification of user's verified status if REQUIRE_USERS_VERIFIED is True
+    Optional verification of user's verified status if REQUIRE_USERS_VERIFIED is True.
+    Status is read from a replica; the primary is only opened if the replica reports
+    the user missing or unverified, which may just be lag.
     """
     token = header_to_token(request)
     auther = get_auther(request)
@@ -122,13 +253,14 @@ async def access_token_header_to_user_id(request: Request, db: AsyncSession = De
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    validate_token_contents(decoded, expected_type="access")
-    user_id = uuid.UUID(decoded.get("id"))
+    user_id = validate_token_contents(decoded, expected_type="access")
     
-    # Check if user is verified when required
-    if verify_user:
-        result = await db.execute(select(User).where(User.id == user_id))
-        user = result.scalar_one_or_none()
+    # Check if user is verified when required (tokens carrying the verified claim already prove it)
+    if verify_user and not (ACCESS_TOKEN_VERIFIED_CLAIM and decoded.get("verified")):
+        user = await cached_user_status_by_id(db, user_id, primary=primary)
+        # Release the connections now rather than when the whole request finishes
+        await db.release()
+        await primary.release()
         if user is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -155,11 +287,10 @@ async def refresh_token_header_to_user_id(request: Request):
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    validate_token_contents(decoded, expected_type="refresh")
-    return uuid.UUID(decoded.get("id"))
+    return validate_token_contents(decoded, expected_type="refresh")
 
-async def partial_token_header_to_user_id(request: Request):
-    """Validate partial token (for 2FA flow) and return user ID"""
+async def partial_token_header_to_claims(request: Request):
+    """Validate partial token (for 2FA flow) and return user ID and token claims"""
     token = header_to_token(request)
     auther = get_auther(request)
     
@@ -171,11 +302,15 @@ async def partial_token_header_to_user_id(request: Request):
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    validate_token_contents(decoded, expected_type="partial")
-    return uuid.UUID(decoded.get("id"))
+    return validate_token_contents(decoded, expected_type="partial"), decoded
+
+async def partial_token_header_to_user_id(request: Request):
+    """Validate partial token (for 2FA flow) and return user ID"""
+    user_id, _ = await partial_token_header_to_claims(request)
+    return user_id
 
 def validate_token_contents(decoded, expected_type=None):
-    """Validate that token contains required fields and is of the expected type"""
+    """Validate that token contains required fields and is of the expected type. Returns the user ID."""
     user_id = decoded.get("id")
     token_type = decoded.get("type")
     email = decoded.get("email")
@@ -206,7 +341,7 @@ def validate_token_contents(decoded, expected_type=None):
     
     # Verify user_id is a valid UUID
     try:
-        uuid.UUID(user_id)
+        return uuid.UUID(user_id)
     except ValueError:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -0,0 +1,150 @@
+"""
+JWT signing keys.
+
+Keys are parsed once (normally at startup) into prepared key objects. The current
+key signs every token and its `kid` goes in the token header; older keys listed in
+JWT_VERIFY_KEYS stay valid for verification so keys can be rotated with an overlap.
+For asymmetric algorithms (EdDSA, ES256, ...) the public keys are published as a
+JWKS document so other services can verify tokens locally.
+
+Generate a new key with:
+
+    python -m util.keys --algorithm EdDSA > private.pem
+"""
+import argparse
+import base64
+import hashlib
+import json
+import sys
+from typing import Dict, Optional
+import jwt
+from jwt.algorithms import get_default_algorithms, has_crypto
+from app.settings import (
+    SECRET_KEY,
+    JWT_ALGORITHM,
+    JWT_KEY_ID,
+    JWT_PRIVATE_KEY_PATH,
+    JWT_VERIFY_KEYS,
+)
+
+SYMMETRIC_ALGORITHMS = {"HS256", "HS384", "HS512"}
+
+def _b64url(data: bytes) -> bytes:
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+
+class SigningKey:
+    """A single key, prepared for signing and/or verifying."""
+    def __init__(self, kid: str, algorithm: str, signing_key=None, verifying_key=None):
+        self.kid = kid
+        self.algorithm = algorithm
+        self.signing_key = signing_key
+        self.verifying_key = verifying_key
+
+        # The JOSE header is identical for every token this key signs, so encode it once
+        self._alg = get_default_algorithms()[algorithm]
+        header = {"alg": algorithm, "kid": kid, "typ": "JWT"}
+        self._header_segment = _b64url(json.dumps(header, separators=(",", ":")).encode()) + b"."
+
+    def sign(self, payload: dict) -> str:
+        """
+        Encode and sign a JWT. Equivalent to jwt.encode with this key and a kid header,
+        but reuses the pre-encoded header. Time claims must already be unix timestamps.
+        """
+        signing_input = self._header_segment + _b64url(json.dumps(payload, separators=(",", ":")).encode())
+        signature = self._alg.sign(signing_input, self.signing_key)
+        return (signing_input + b"." + _b64url(signature)).decode()
+
+    @classmethod
+    def from_material(cls, kid: str, algorithm: str, material: bytes, can_sign: bool = True):
+        """Parse a secret (HS*) or PEM key (asymmetric) into prepared key objects."""
+        alg = get_default_algorithms().get(algorithm)
+        if alg is None:
+            raise ValueError(f"Unsupported JWT algorithm: {algorithm}")
+        key = alg.prepare_key(material)
+        if algorithm in SYMMETRIC_ALGORITHMS:
+            return cls(kid, algorithm, signing_key=key if can_sign else None, verifying_key=key)
+        if hasattr(key, "public_key"):
+            return cls(kid, algorithm, signing_key=key if can_sign else None, verifying_key=key.public_key())
+        return cls(kid, algorithm, verifying_key=key)
+
+    @property
+    def is_public(self) -> bool:
+        return self.algorithm not in SYMMETRIC_ALGORITHMS
+
+    def to_jwk(self) -> dict:
+        jwk = self._alg.to_jwk(self.verifying_key, as_dict=True)
+        jwk.update({"kid": self.kid, "alg": self.algorithm, "use": "sig"})
+        return jwk
+
+
+class KeyRing:
+    """The current signing key plus every key still accepted for verification."""
+    def __init__(self, current: SigningKey, retired: Optional[Dict[str, SigningKey]] = None):
+        self.current = current
+        self.keys = dict(retired or {})
+        self.keys[current.kid] = current
+
+        # The JWKS document never changes while running, so serialize it once
+        jwks = {"keys": [key.to_jwk() for key in self.keys.values() if key.is_public]}
+        self.jwks = json.dumps(jwks, separators=(",", ":")).encode("utf-8")
+        self.jwks_etag = '"' + hashlib.sha256(self.jwks).hexdigest()[:32] + '"'
+
+    @classmethod
+    def from_settings(cls) -> "KeyRing":
+        if JWT_ALGORITHM in SYMMETRIC_ALGORITHMS:
+            current = SigningKey.from_material(JWT_KEY_ID, JWT_ALGORITHM, SECRET_KEY.encode())
+        else:
+            if not JWT_PRIVATE_KEY_PATH:
+                raise ValueError(f"JWT_PRIVATE_KEY_PATH is required for {JWT_ALGORITHM}")
+            current = SigningKey.from_material(JWT_KEY_ID, JWT_ALGORITHM, _read(JWT_PRIVATE_KEY_PATH))
+
+        retired = {}
+        for entry in filter(None, (e.strip() for e in JWT_VERIFY_KEYS.split(","))):
+            # Format: kid=ALGORITHM:path
+            kid, _, spec = entry.partition("=")
+            algorithm, _, path = spec.partition(":")
+            retired[kid] = SigningKey.from_material(kid, algorithm, _read(path), can_sign=False)
+        return cls(current, retired)
+
+    def verification_key(self, token: str) -> SigningKey:
+        """Pick the key a token claims to be signed with (tokens without a kid use the current key)."""
+        kid = jwt.get_unverified_header(token).get("kid")
+        if kid is None:
+            return self.current
+        key = self.keys.get(kid)
+        if key is None:
+            raise jwt.InvalidTokenError("Unknown signing key")
+        return key
+
+
+def _read(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def generate_private_key_pem(algorithm: str) -> bytes:
+    """Create a new private key in PEM format for the given algorithm."""
+    if not has_crypto:
+        raise RuntimeError("The cryptography package is required for asymmetric keys")
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import ec, ed25519
+
+    if algorithm == "EdDSA":
+        key = ed25519.Ed25519PrivateKey.generate()
+    elif algorithm == "ES256":
+        key = ec.generate_private_key(ec.SECP256R1())
+    else:
+        raise ValueError(f"Key generation not supported for {algorithm}")
+    return key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption(),
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a JWT signing key.")
+    parser.add_argument("--algorithm", choices=["EdDSA", "ES256"], default="EdDSA")
+    args = parser.parse_args()
+    sys.stdout.buffer.write(generate_private_key_pem(args.algorithm))
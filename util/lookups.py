@@ -0,0 +1,111 @@
+"""
+Column-only user lookups for the authentication hot paths.
+
+Login, email verification and the access-token dependency only need a
+handful of columns, so these select exactly those columns with Core statements and
+wrap each row in a small slotted object. Nothing goes through the ORM identity map,
+attribute instrumentation or relationship setup.
+
+Each lookup takes the session to read from and, optionally, the primary session: if
+the read went to a replica and found nothing, it is retried on the primary, since a
+replica can lag behind an account that was just created. Status lookups also retry
+an unverified result, since the replica can lag behind a verification too.
+"""
+import time
+from typing import Optional
+from sqlalchemy import event, lambda_stmt, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models import User
+from app.settings import USER_STATUS_CACHE_SECONDS, USER_STATUS_CACHE_MAX_SIZE
+from util.cache import TTLCache
+
+class AuthUser:
+    """The columns login needs to authenticate a user."""
+    __slots__ = ("id", "email", "hashed_password", "is_verified", "require_2fa")
+
+    def __init__(self, id, email: str, hashed_password: str, is_verified: bool, require_2fa: bool):
+        self.id = id
+        self.email = email
+        self.hashed_password = hashed_password
+        self.is_verified = is_verified
+        self.require_2fa = require_2fa
+
+
+class UserStatus:
+    """Whether a user exists and has verified their email."""
+    __slots__ = ("id", "is_verified")
+
+    def __init__(self, id, is_verified: bool):
+        self.id = id
+        self.is_verified = is_verified
+
+
+# Lambda statements: after the first call SQLAlchemy reuses both the statement
+# construct and its compiled form, and only pulls the new bound values out of the closure.
+def _auth_user_by_email_stmt(email: str):
+    return lambda_stmt(lambda: select(
+        User.id, User.email, User.hashed_password, User.is_verified, User.require_2fa
+    ).where(User.email == email))
+
+def _status_by_email_stmt(email: str):
+    return lambda_stmt(lambda: select(User.id, User.is_verified).where(User.email == email))
+
+def _status_by_id_stmt(user_id):
+    return lambda_stmt(lambda: select(User.id, User.is_verified).where(User.id == user_id))
+
+async def _first(db: AsyncSession, primary: Optional[AsyncSession], stmt, query_name: str, stale=lambda row: False):
+    # query_name labels the statement in util.db.query_stats()
+    options = {"query_name": query_name}
+    row = (await db.execute(stmt, execution_options=options)).first()
+    if (row is None or stale(row)) and primary is not None and db.info.get("replica"):
+        row = (await primary.execute(stmt, execution_options=options)).first()
+    return row
+
+def _unverified(row) -> bool:
+    return not row.is_verified
+
+async def auth_user_by_email(db: AsyncSession, email: str, primary: Optional[AsyncSession] = None) -> Optional[AuthUser]:
+    row = await _first(db, primary, _auth_user_by_email_stmt(email), "auth_user_by_email")
+    return AuthUser(*row) if row is not None else None
+
+async def user_status_by_email(db: AsyncSession, email: str, primary: Optional[AsyncSession] = None) -> Optional[UserStatus]:
+    row = await _first(db, primary, _status_by_email_stmt(email), "user_status_by_email", _unverified)
+    return UserStatus(*row) if row is not None else None
+
+async def user_status_by_id(db: AsyncSession, user_id, primary: Optional[AsyncSession] = None) -> Optional[UserStatus]:
+    row = await _first(db, primary, _status_by_id_stmt(user_id), "user_status_by_id", _unverified)
+    return UserStatus(*row) if row is not None else None
+
+
+#######################################
+# USER STATUS CACHE
+#######################################
+
+# user id -> (exists, is_verified), so the verified-user check on private routes
+# doesn't cost a query per request. Invalidated locally on verification and
+# deletion; other workers catch up within USER_STATUS_CACHE_SECONDS.
+user_status_cache = TTLCache(max_size=USER_STATUS_CACHE_MAX_SIZE)
+
+async def cached_user_status_by_id(db: AsyncSession, user_id, primary: Optional[AsyncSession] = None) -> Optional[UserStatus]:
+    entry = user_status_cache.get(user_id)
+    if entry is not None:
+        exists, is_verified = entry
+        return UserStatus(user_id, is_verified) if exists else None
+
+    status = await user_status_by_id(db, user_id, primary=primary)
+    # A replica's "missing" or "unverified" may just be lag behind a signup or a
+    # verification, and caching it would hold the user at 404/403 for the whole TTL.
+    # Only cache what the primary said, or a verified status (which doesn't revert).
+    from_primary = not db.info.get("replica") or primary is not None
+    if from_primary or (status is not None and status.is_verified):
+        entry = (True, status.is_verified) if status is not None else (False, False)
+        user_status_cache.set(user_id, entry, time.time() + USER_STATUS_CACHE_SECONDS)
+    return status
+
+def invalidate_user_status(user_id):
+    """Drop a cached status after changing is_verified or deleting the user outside the ORM."""
+    user_status_cache.pop(user_id)
+
+@event.listens_for(User, "after_delete")
+def _user_deleted(mapper, connection, target):
+    invalidate_user_status(target.id)
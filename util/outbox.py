@@ -0,0 +1,212 @@
+"""
+Transactional outbox for emails that must not be lost (2FA codes, verification links).
+
+The email is inserted into `email_outbox` by the same transaction as the change
+that triggers it, so either both are committed or neither is. OutboxRelay then
+claims pending rows in batches, hands them to the email transport and marks them
+delivered. Claims are leases: a row claimed by a relay that dies becomes
+claimable again after OUTBOX_LEASE_SECONDS, so delivery is at-least-once.
+
+Rows the provider rejects for good, and rows still failing after max_attempts, are
+stamped failed_at and stop being claimed. A refused API key is not held against the
+rows: they are put back without using up an attempt, and the relay backs off (up to
+OUTBOX_AUTH_RETRY_MAX_SECONDS) until the key works again. Delivered and failed rows are both
+deleted by the expired-row sweeper, so payloads (which hold codes and links) don't
+outlive their delivery.
+
+On Postgres the claim skips rows other relays have locked (FOR UPDATE SKIP LOCKED);
+on SQLite the claim is a single UPDATE, which the database already serializes.
+"""
+import asyncio
+import logging
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Callable, List, Optional
+from sqlalchemy import insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models import EmailOutbox
+from app.settings import (
+    EMAIL_BATCH_SIZE,
+    EMAIL_MAX_RETRIES,
+    EMAIL_RETRY_BASE_SECONDS,
+    OUTBOX_POLL_SECONDS,
+    OUTBOX_LEASE_SECONDS,
+    OUTBOX_AUTH_RETRY_MAX_SECONDS,
+)
+from util.db import SessionLocal, engine, single_writer
+from util.email_queue import EmailAuthError, EmailTransport, send_isolating_rejects
+
+logger = logging.getLogger("plankton-api")
+
+async def add_to_outbox(db: AsyncSession, message: dict):
+    """Stage an email in the caller's transaction; it is sent once that transaction commits."""
+    await db.execute(insert(EmailOutbox).values(payload=message))
+
+
+class OutboxRelay:
+    def __init__(
+        self,
+        transport: EmailTransport,
+        session_factory: Callable = SessionLocal,
+        batch_size: int = EMAIL_BATCH_SIZE,
+        poll_interval: float = OUTBOX_POLL_SECONDS,
+        lease_seconds: float = OUTBOX_LEASE_SECONDS,
+        max_attempts: int = EMAIL_MAX_RETRIES + 1,
+        retry_base: float = EMAIL_RETRY_BASE_SECONDS,
+        auth_retry_max: float = OUTBOX_AUTH_RETRY_MAX_SECONDS,
+    ):
+        self.transport = transport
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.auth_retry_max = auth_retry_max
+        self._auth_failures = 0  # In a row; sets the backoff while the key is refused
+        self._wake = asyncio.Event()
+        self._stopping = False
+        self._task: Optional[asyncio.Task] = None
+
+        # Metrics
+        self.claimed = 0
+        self.delivered = 0
+        self.rejected = 0
+        self.given_up = 0
+        self.failed_batches = 0
+
+    def notify(self):
+        """Wake the relay right away, e.g. after committing an outbox row."""
+        self._wake.set()
+
+    async def _claim(self) -> List[tuple]:
+        now = datetime.now(timezone.utc)
+        pending = (
+            select(EmailOutbox.id)
+            .where(
+                EmailOutbox.delivered_at.is_(None),
+                EmailOutbox.failed_at.is_(None),
+                EmailOutbox.available_at <= now,
+            )
+            .order_by(EmailOutbox.id)
+            .limit(self.batch_size)
+        )
+        if engine.dialect.name == "postgresql":
+            pending = pending.with_for_update(skip_locked=True)
+
+        async with self.session_factory() as db, single_writer.slot():
+            result = await db.execute(
+                update(EmailOutbox)
+                .where(EmailOutbox.id.in_(pending))
+                .values(
+                    available_at=now + timedelta(seconds=self.lease_seconds),
+                    attempts=EmailOutbox.attempts + 1,
+                )
+                .returning(EmailOutbox.id, EmailOutbox.payload, EmailOutbox.attempts)
+                .execution_options(synchronize_session=False)
+            )
+            rows = result.all()
+            await db.commit()
+        self.claimed += len(rows)
+        return rows
+
+    async def _finish(self, ids: List[int], values: dict):
+        async with self.session_factory() as db, single_writer.slot():
+            await db.execute(
+                update(EmailOutbox)
+                .where(EmailOutbox.id.in_(ids))
+                .values(**values)
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+
+    async def relay_once(self) -> int:
+        """Claim and send one batch. Returns how many emails were claimed, or 0 while the provider refuses our key."""
+        rows = await self._claim()
+        if not rows:
+            return 0
+        try:
+            rejected = await send_isolating_rejects(self.transport, [row.payload for row in rows])
+        except EmailAuthError as e:
+            self.failed_batches += 1
+            await self._wait_for_credentials(rows, str(e)[:500])
+            return 0  # Pause: other batches would be refused too
+        except Exception as e:
+            self.failed_batches += 1
+            await self._retry_or_give_up(rows, str(e)[:500])
+            return len(rows)
+
+        self._auth_failures = 0
+        now = datetime.now(timezone.utc)
+        rejected_payloads = {id(message): str(error)[:500] for message, error in rejected}
+        for row in rows:
+            error = rejected_payloads.get(id(row.payload))
+            if error is not None:
+                logger.error(f"Outbox email {row.id} rejected: {error}")
+                await self._finish([row.id], {"failed_at": now, "last_error": error})
+        delivered = [row.id for row in rows if id(row.payload) not in rejected_payloads]
+        if delivered:
+            await self._finish(delivered, {"delivered_at": now, "last_error": None})
+        self.delivered += len(delivered)
+        self.rejected += len(rows) - len(delivered)
+        return len(rows)
+
+    async def _retry_or_give_up(self, rows: List[tuple], error: str):
+        now = datetime.now(timezone.utc)
+        exhausted = [row.id for row in rows if row.attempts >= self.max_attempts]
+        if exhausted:
+            logger.error(f"Giving up on {len(exhausted)} outbox emails after {self.max_attempts} attempts: {error}")
+            await self._finish(exhausted, {"failed_at": now, "last_error": error})
+            self.given_up += len(exhausted)
+        retrying = [row for row in rows if row.attempts < self.max_attempts]
+        if retrying:
+            attempts = max(row.attempts for row in retrying)
+            delay = self.retry_base * 2 ** (attempts - 1)
+            retry_at = now + timedelta(seconds=delay + random.uniform(0, delay / 2))
+            await self._finish([row.id for row in retrying], {"available_at": retry_at, "last_error": error})
+
+    async def _wait_for_credentials(self, rows: List[tuple], error: str):
+        # Hand back the attempt the claim took and hold the rows until the next try
+        self._auth_failures += 1
+        delay = min(self.retry_base * 2 ** (self._auth_failures - 1), self.auth_retry_max)
+        logger.error(f"Email provider refused our credentials, retrying {len(rows)} outbox emails in {delay:.0f}s: {error}")
+        retry_at = datetime.now(timezone.utc) + timedelta(seconds=delay)
+        await self._finish(
+            [row.id for row in rows],
+            {"available_at": retry_at, "attempts": EmailOutbox.attempts - 1, "last_error": error},
+        )
+
+    async def run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                # Keep going while full batches come back
+                while not self._stopping and await self.relay_once() >= self.batch_size:
+                    pass
+            except Exception as e:
+                logger.error(f"Outbox relay error: {e}", exc_info=True)
+
+    def start(self):
+        self._stopping = False
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        """Stop after the batch in progress; unsent rows wait for the next start."""
+        self._stopping = True
+        self._wake.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "claimed": self.claimed,
+            "delivered": self.delivered,
+            "rejected": self.rejected,
+            "given_up": self.given_up,
+            "failed_batches": self.failed_batches,
+        }
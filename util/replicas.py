@@ -0,0 +1,71 @@
+"""
+Read replicas for read-only sessions.
+
+Set DATABASE_REPLICA_URLS to spread reads over replicas. A replica that fails is
+ejected for REPLICA_EJECT_SECONDS, and reads go to the others, or to the primary
+when none is healthy.
+"""
+import itertools
+import logging
+import time
+from typing import List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+from app.settings import DATABASE_REPLICA_URLS, REPLICA_SELECTION, REPLICA_EJECT_SECONDS
+from util.db import InstrumentedPool, create_engine, pool_stats
+
+logger = logging.getLogger("plankton-api")
+
+class Replica:
+    """One read replica and its health state."""
+    def __init__(self, url: str):
+        self.url = url
+        self.engine = create_engine(url)
+        self.sessionmaker = sessionmaker(bind=self.engine, class_=AsyncSession, autocommit=False, autoflush=False) # type: ignore
+        self.ejected_until = 0.0
+        self.failures = 0
+
+    @property
+    def healthy(self) -> bool:
+        return self.ejected_until <= time.monotonic()
+
+    def load(self) -> int:
+        pool = self.engine.pool
+        return pool.checkedout() if isinstance(pool, InstrumentedPool) else 0
+
+class ReplicaSet:
+    """
+    Chooses a replica for read-only sessions. Replicas that fail to hand out a
+    connection, or fail a query (see util.sessions.LazySession), are ejected for
+    REPLICA_EJECT_SECONDS; when none is healthy, reads fall back to the primary.
+    """
+    def __init__(self, urls: List[str], selection: str = REPLICA_SELECTION, eject_seconds: float = REPLICA_EJECT_SECONDS):
+        self.replicas = [Replica(url) for url in urls]
+        self.selection = selection
+        self.eject_seconds = eject_seconds
+        self._counter = itertools.count()
+
+    def choose(self) -> Optional[Replica]:
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            return None
+        if self.selection == "least_loaded":
+            return min(healthy, key=Replica.load)
+        return healthy[next(self._counter) % len(healthy)]
+
+    def mark_failed(self, replica: Replica):
+        replica.failures += 1
+        replica.ejected_until = time.monotonic() + self.eject_seconds
+        logger.warning(f"Read replica ejected for {self.eject_seconds}s after failure")
+
+    def stats(self) -> List[dict]:
+        return [
+            {"healthy": replica.healthy, "failures": replica.failures, **pool_stats(replica.engine)}
+            for replica in self.replicas
+        ]
+
+    async def dispose(self):
+        for replica in self.replicas:
+            await replica.engine.dispose()
+
+replicas = ReplicaSet(DATABASE_REPLICA_URLS)
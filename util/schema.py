@@ -0,0 +1,100 @@
+"""
+Schema setup at startup.
+
+create_db_tables runs create_all only when the models' DDL fingerprint differs from
+the one recorded in the `schema_version` table, under a lock so workers starting
+together don't run DDL at the same time.
+"""
+import asyncio
+import hashlib
+import logging
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import Optional
+from sqlalchemy import Column, DateTime, Integer, String, Table, delete, exc, insert, select, text
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.schema import CreateIndex, CreateTable
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+from util.db import Base, engine
+
+logger = logging.getLogger("plankton-api")
+
+# One row holding the fingerprint of the schema the database was last set up for
+schema_version = Table(
+    "schema_version",
+    Base.metadata,
+    Column("id", Integer, primary_key=True),
+    Column("fingerprint", String(64), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+# Arbitrary, fixed key for pg_advisory_xact_lock
+SCHEMA_LOCK_KEY = 0x504C414E4B544F4E
+
+def schema_fingerprint(target_engine=None) -> str:
+    """Hash of the DDL for every table and index in the models, as the database would run it."""
+    dialect = (target_engine if target_engine is not None else engine).dialect
+    ddl = []
+    for table in Base.metadata.sorted_tables:
+        if table is schema_version:
+            continue
+        ddl.append(str(CreateTable(table).compile(dialect=dialect)))
+        ddl.extend(str(CreateIndex(index).compile(dialect=dialect)) for index in sorted(table.indexes, key=lambda i: i.name))
+    return hashlib.sha256("\n".join(ddl).encode()).hexdigest()
+
+async def _stored_fingerprint(conn) -> Optional[str]:
+    try:
+        result = await conn.execute(select(schema_version.c.fingerprint).where(schema_version.c.id == 1))
+    except exc.DBAPIError:
+        # No version table yet
+        return None
+    return result.scalar_one_or_none()
+
+@asynccontextmanager
+async def _schema_lock(conn):
+    """Keep workers that start together from running DDL at the same time."""
+    if conn.dialect.name == "postgresql":
+        # Released when the surrounding transaction ends
+        await conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": SCHEMA_LOCK_KEY})
+        yield
+        return
+    database = conn.engine.url.database
+    if conn.dialect.name != "sqlite" or not database or database == ":memory:" or fcntl is None:
+        yield
+        return
+    # SQLite is single-node, so a lock file next to the database serves the same purpose
+    with open(database + ".schema-lock", "w") as lock_file:
+        await asyncio.to_thread(fcntl.flock, lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+async def create_db_tables() -> bool:
+    """
+    Create missing tables, but only when the models changed since the last run.
+    The usual startup costs one query. Returns whether DDL ran.
+    """
+    fingerprint = schema_fingerprint()
+    async with engine.connect() as conn:
+        if await _stored_fingerprint(conn) == fingerprint:
+            return False
+
+    async with engine.begin() as conn:
+        async with _schema_lock(conn):
+            # Another worker may have finished while we waited for the lock. Check the table
+            # exists first: on Postgres a failed query would abort this transaction.
+            has_version_table = await conn.run_sync(lambda sync_conn: sa_inspect(sync_conn).has_table("schema_version"))
+            if has_version_table and await _stored_fingerprint(conn) == fingerprint:
+                return False
+            logger.info("Schema fingerprint changed, running create_all")
+            # create_all only adds missing tables and indexes; changes to existing ones need a migration
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.execute(delete(schema_version))
+            await conn.execute(insert(schema_version).values(
+                id=1, fingerprint=fingerprint, applied_at=datetime.now(timezone.utc)
+            ))
+    return True
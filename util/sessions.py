@@ -0,0 +1,153 @@
+"""
+Request-scoped database sessions: `get_db` for the primary and `get_read_db` for
+read-only work, which goes to a replica when one is configured.
+"""
+import inspect
+from typing import Any, Callable, Optional
+from sqlalchemy import exc
+from sqlalchemy.ext.asyncio import AsyncSession
+from util.db import SessionLocal
+from util.replicas import replicas
+
+class LazySession:
+    """
+    Request-scoped stand-in for an AsyncSession that only opens the real session
+    (and so only checks out a connection) on first use. Requests that fail before
+    touching the database never take a pooled connection, and `release()` hands
+    the connection back as soon as the handler is done with it.
+
+    Anything not defined here is proxied to the real session, opening it first when
+    the opener is synchronous (get_db). Read sessions (get_read_db) are opened
+    asynchronously, so run a query before reaching for other session attributes.
+    `info` written before the session opens is copied into it on open, and lasts
+    until `release()`.
+    """
+    def __init__(self, open_session: Callable[[], Any]):
+        # open_session returns an AsyncSession, or an awaitable of one
+        self._open = open_session
+        self._session: Optional[AsyncSession] = None
+        self._pending_info: dict = {}
+
+    @property
+    def opened(self) -> bool:
+        return self._session is not None
+
+    @property
+    def info(self) -> dict:
+        return self._session.info if self._session is not None else self._pending_info
+
+    def _attach(self, session: AsyncSession) -> AsyncSession:
+        # Keys set by the opener (e.g. "replica") win over ones written beforehand
+        for key, value in self._pending_info.items():
+            session.info.setdefault(key, value)
+        self._pending_info = {}
+        self._session = session
+        return session
+
+    def _open_sync(self, purpose: str) -> AsyncSession:
+        if self._session is None:
+            session = self._open()
+            if inspect.isawaitable(session):
+                session.close()  # discard the un-awaited opener
+                raise RuntimeError(f"{purpose} needs an open session; run a query first or use get_db")
+            self._attach(session)
+        return self._session
+
+    async def _get(self) -> AsyncSession:
+        if self._session is None:
+            session = self._open()
+            if inspect.isawaitable(session):
+                session = await session
+            self._attach(session)
+        return self._session
+
+    def __getattr__(self, name: str):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self._open_sync(name), name)
+
+    async def _read(self, method: str, *args, **kwargs):
+        session = await self._get()
+        try:
+            return await getattr(session, method)(*args, **kwargs)
+        except exc.DBAPIError:
+            # A replica can accept connections yet fail queries (recovery conflicts, a
+            # missing table): eject it and run the query again on whatever opens next,
+            # another replica or the primary. Replica sessions only ever read.
+            replica = session.info.get("replica")
+            if not replica:
+                raise
+            replicas.mark_failed(replica)
+            await self.release()
+            return await getattr(await self._get(), method)(*args, **kwargs)
+
+    async def execute(self, *args, **kwargs):
+        return await self._read("execute", *args, **kwargs)
+
+    async def scalar(self, *args, **kwargs):
+        return await self._read("scalar", *args, **kwargs)
+
+    async def scalars(self, *args, **kwargs):
+        return await self._read("scalars", *args, **kwargs)
+
+    async def get(self, *args, **kwargs):
+        return await self._read("get", *args, **kwargs)
+
+    async def flush(self, *args, **kwargs):
+        return await (await self._get()).flush(*args, **kwargs)
+
+    async def refresh(self, *args, **kwargs):
+        return await (await self._get()).refresh(*args, **kwargs)
+
+    async def delete(self, instance):
+        return await (await self._get()).delete(instance)
+
+    def add(self, instance):
+        self._open_sync("add()").add(instance)
+
+    async def commit(self):
+        if self._session is not None:
+            await self._session.commit()
+
+    async def rollback(self):
+        if self._session is not None:
+            await self._session.rollback()
+
+    async def release(self):
+        """Close the session now, returning its connection to the pool. It reopens on next use."""
+        if self._session is not None:
+            session, self._session = self._session, None
+            await session.close()
+
+async def get_db():
+    """Session on the primary database, opened on first use."""
+    session = LazySession(SessionLocal)
+    try:
+        yield session
+    finally:
+        await session.release()
+
+async def open_read_session() -> AsyncSession:
+    """Session on a healthy replica, or on the primary if none is available."""
+    while True:
+        replica = replicas.choose()
+        if replica is None:
+            return SessionLocal()
+        session = replica.sessionmaker()
+        # Truthy for replica sessions; LazySession uses it to eject a replica whose queries fail
+        session.info["replica"] = replica
+        try:
+            # Check out the connection now so a dead replica is detected before the handler runs
+            await session.connection()
+            return session
+        except (exc.DBAPIError, exc.TimeoutError, OSError):
+            await session.close()
+            replicas.mark_failed(replica)
+
+async def get_read_db():
+    """Session for read-only work, routed to a read replica when configured and opened on first use."""
+    session = LazySession(open_read_session)
+    try:
+        yield session
+    finally:
+        await session.release()
@@ -0,0 +1,136 @@
+"""
+Periodic cleanup of expired rows in short-lived tables (2FA codes, revoked tokens, ...).
+
+Each run deletes expired rows table by table in bounded batches, one short
+transaction per batch, so no run holds locks or a connection for long. Runs are
+spaced SWEEP_INTERVAL_SECONDS apart with random jitter (so several workers don't
+sweep in lockstep), and a run is skipped with a growing delay while the connection
+pool is saturated.
+
+Register another table with `sweeper.register(Model, Model.expires_at)`.
+"""
+import asyncio
+import logging
+import random
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+from sqlalchemy import delete, select
+from app.settings import (
+    SWEEP_INTERVAL_SECONDS,
+    SWEEP_BATCH_SIZE,
+    SWEEP_MAX_BATCHES,
+    SWEEP_JITTER,
+)
+from util.db import SessionLocal, engine, pool_stats, single_writer
+
+logger = logging.getLogger("plankton-api")
+
+class ExpiredRowSweeper:
+    def __init__(
+        self,
+        session_factory: Callable = SessionLocal,
+        interval: float = SWEEP_INTERVAL_SECONDS,
+        batch_size: int = SWEEP_BATCH_SIZE,
+        max_batches: int = SWEEP_MAX_BATCHES,
+        jitter: float = SWEEP_JITTER,
+    ):
+        self.session_factory = session_factory
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_batches = max_batches
+        self.jitter = jitter
+        self.tables: List[Tuple[type, object]] = []
+        self._stop = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+        # Metrics
+        self.runs = 0
+        self.skipped_busy = 0
+        self.errors = 0
+        self.deleted: Dict[str, int] = {}
+        self.last_run_at: Optional[float] = None
+
+    def register(self, model, expires_column):
+        """Sweep rows of `model` once `expires_column` is in the past."""
+        self.tables.append((model, expires_column))
+        self.deleted.setdefault(model.__tablename__, 0)
+
+    def _busy(self) -> bool:
+        stats = pool_stats(engine)
+        return bool(stats) and stats["checked_out"] >= stats["pool_size"]
+
+    async def _delete_batch(self, model, expires_column, now: datetime) -> int:
+        # DELETE ... LIMIT isn't portable, so pick the batch's keys in a subquery
+        pk = model.__table__.primary_key.columns.values()[0]
+        expired = select(pk).where(expires_column <= now).limit(self.batch_size)
+        async with self.session_factory() as db, single_writer.slot():
+            result = await db.execute(
+                delete(model).where(pk.in_(expired)).execution_options(synchronize_session=False)
+            )
+            await db.commit()
+        return result.rowcount
+
+    async def sweep(self) -> int:
+        """Delete expired rows from every registered table. Returns how many were deleted."""
+        now = datetime.now(timezone.utc)
+        total = 0
+        for model, expires_column in self.tables:
+            for _ in range(self.max_batches):
+                # Shutting down: leave the rest for the next start
+                if self._stop.is_set():
+                    break
+                deleted = await self._delete_batch(model, expires_column, now)
+                self.deleted[model.__tablename__] += deleted
+                total += deleted
+                if deleted < self.batch_size:
+                    break
+                # Let waiting requests have the database between batches
+                await asyncio.sleep(0)
+        self.runs += 1
+        self.last_run_at = time.time()
+        return total
+
+    async def run(self):
+        delay = self.interval
+        while not self._stop.is_set():
+            try:
+                await asyncio.wait_for(self._stop.wait(), timeout=delay * random.uniform(1 - self.jitter, 1 + self.jitter))
+                break
+            except asyncio.TimeoutError:
+                pass
+
+            if self._busy():
+                # Back off while requests are queueing for connections
+                self.skipped_busy += 1
+                delay = min(delay * 2, self.interval * 8)
+                continue
+            delay = self.interval
+
+            try:
+                deleted = await self.sweep()
+                if deleted:
+                    logger.info(f"Swept {deleted} expired rows")
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Expired row sweep error: {e}", exc_info=True)
+
+    def start(self):
+        self._stop.clear()
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        """Stop after the batch in progress, if any."""
+        self._stop.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "runs": self.runs,
+            "skipped_busy": self.skipped_busy,
+            "errors": self.errors,
+            "deleted": dict(self.deleted),
+            "last_run_at": self.last_run_at,
+        }
@@ -0,0 +1,97 @@
+"""
+Email templates, compiled once.
+
+Templates live in util/email_templates as <kind>.html and <kind>.txt, with
+`{{ placeholder }}` markers. At import each one is read, minified (HTML only), and
+split into its static segments and placeholder slots, so rendering is a single
+join of cached strings. Values are HTML-escaped in the HTML version.
+
+Set EMAIL_TEMPLATE_DIR to a directory of files with the same names to override
+any of them for a deployment; kinds missing there use the built-in files. An
+override may only use placeholders its built-in template has, since those are
+the only values passed in; anything else fails at startup rather than mid-request.
+"""
+import html
+import os
+import re
+from typing import Dict, List, Tuple
+from app.settings import EMAIL_TEMPLATE_DIR
+
+BUILTIN_DIR = os.path.join(os.path.dirname(__file__), "email_templates")
+
+_PLACEHOLDER = re.compile(r"{{\s*(\w+)\s*}}")
+_PRESERVED = re.compile(r"<(pre|textarea)\b.*?</\1\s*>", flags=re.S | re.I)
+
+def minify_html(source: str) -> str:
+    """
+    Drop comments and indentation. Conservative: whitespace inside text collapses to
+    one space. <pre> and <textarea> blocks are left exactly as written.
+    """
+    preserved: List[str] = []
+    def stash(match):
+        preserved.append(match.group(0))
+        return f"\x00{len(preserved) - 1}\x00"
+    source = _PRESERVED.sub(stash, source)
+    source = re.sub(r"<!--.*?-->", "", source, flags=re.S)
+    source = re.sub(r">\s+<", "><", source)
+    source = re.sub(r"\s+", " ", source)
+    # Inside <style>, CSS punctuation doesn't need surrounding spaces
+    source = re.sub(
+        r"(<style[^>]*>)(.*?)(</style>)",
+        lambda m: m.group(1) + re.sub(r"\s*([{};:,>])\s*", r"\1", m.group(2)).strip() + m.group(3),
+        source,
+        flags=re.S,
+    )
+    source = re.sub(r"\x00(\d+)\x00", lambda m: preserved[int(m.group(1))], source)
+    return source.strip()
+
+class Template:
+    """A template pre-split into static text and placeholder slots."""
+    def __init__(self, source: str, escape: bool = False):
+        parts = _PLACEHOLDER.split(source)
+        # split() alternates static text and placeholder names: even indexes are static
+        self._parts: List[str] = parts
+        self._slots: List[Tuple[int, str]] = [(i, parts[i]) for i in range(1, len(parts), 2)]
+        self.escape = escape
+        self.placeholders = {name for _, name in self._slots}
+
+    def render(self, **values) -> str:
+        parts = self._parts.copy()
+        for index, name in self._slots:
+            value = str(values[name])
+            parts[index] = html.escape(value) if self.escape else value
+        return "".join(parts)
+
+def _read_file(directory: str, kind: str, extension: str) -> str:
+    with open(os.path.join(directory, f"{kind}.{extension}"), encoding="utf-8") as f:
+        return f.read()
+
+def _compile(source: str, extension: str) -> Template:
+    if extension == "html":
+        return Template(minify_html(source), escape=True)
+    return Template(source.strip() + "\n")
+
+def _load(kind: str, extension: str, override_dir: str) -> Template:
+    builtin = _compile(_read_file(BUILTIN_DIR, kind, extension), extension)
+    if not override_dir or not os.path.exists(os.path.join(override_dir, f"{kind}.{extension}")):
+        return builtin
+    override = _compile(_read_file(override_dir, kind, extension), extension)
+    unknown = override.placeholders - builtin.placeholders
+    if unknown:
+        raise ValueError(
+            f"Email template override {kind}.{extension} uses unknown placeholders "
+            f"{sorted(unknown)}; available: {sorted(builtin.placeholders)}"
+        )
+    return override
+
+def load_templates(override_dir: str = EMAIL_TEMPLATE_DIR) -> Dict[str, Tuple[Template, Template]]:
+    """Compile every built-in kind into (html, text) templates, applying and checking overrides."""
+    kinds = sorted({name.rsplit(".", 1)[0] for name in os.listdir(BUILTIN_DIR)})
+    return {kind: (_load(kind, "html", override_dir), _load(kind, "txt", override_dir)) for kind in kinds}
+
+templates = load_templates()
+
+def render(kind: str, **values) -> Tuple[str, str]:
+    """Render the HTML and plain-text versions of an email."""
+    html_template, text_template = templates[kind]
+    return html_template.render(**values), text_template.render(**values)
@@ -0,0 +1,79 @@
+from datetime import datetime, timezone
+from typing import Optional
+from fastapi import HTTPException, status
+from sqlalchemy import delete, lambda_stmt
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models import TwoFactorAuthCode
+from app.settings import TWO_FACTOR_CODE_STORE, TWO_FACTOR_CODE_EXPIRE_MINUTES, EMAIL_QUEUE_RETRY_AFTER_SECONDS
+from util.db import dialect_insert, single_writer
+from util.email_queue import EmailQueue
+from util.ephemeral import EphemeralStore
+from util.outbox import add_to_outbox
+
+# 2FA codes live either in the two_factor_auth_codes table or in the ephemeral store,
+# depending on TWO_FACTOR_CODE_STORE. Both paths take a single round trip per step.
+
+def _key(user_id) -> str:
+    return f"2fa:{user_id}"
+
+async def issue_2fa_code(
+    db: AsyncSession,
+    store: EphemeralStore,
+    user_id,
+    code: str,
+    email: Optional[dict] = None,
+    email_queue: Optional[EmailQueue] = None,
+):
+    """
+    Save a new 2FA code for the user, replacing any previous one.
+    `email`, if given, goes into the outbox in the same transaction as the code. With
+    the ephemeral store the code never touches SQL, so neither does its email: it is
+    handed to `email_queue` instead (lost if the process dies; the user can log in again).
+    If that queue is full the code is withdrawn and the request gets a 503.
+    """
+    if TWO_FACTOR_CODE_STORE == "ephemeral":
+        await store.set(_key(user_id), code, ttl=TWO_FACTOR_CODE_EXPIRE_MINUTES * 60)
+        if email is not None and not email_queue.enqueue(email):
+            await store.delete(_key(user_id))
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server is busy, please retry shortly",
+                headers={"Retry-After": str(EMAIL_QUEUE_RETRY_AFTER_SECONDS)},
+            )
+        return
+
+    stmt = dialect_insert(TwoFactorAuthCode).values(id=user_id, code=code)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[TwoFactorAuthCode.id],
+        set_={
+            "code": stmt.excluded.code,
+            "created_at": stmt.excluded.created_at,
+            "expires_at": stmt.excluded.expires_at,
+        },
+    )
+    async with single_writer.slot():
+        await db.execute(stmt, execution_options={"query_name": "issue_2fa_code"})
+        if email is not None:
+            await add_to_outbox(db, email)
+        await db.commit()
+
+async def consume_2fa_code(db: AsyncSession, store: EphemeralStore, user_id, code: str) -> bool:
+    """Use up the user's 2FA code if it matches and has not expired. Returns whether it did."""
+    if TWO_FACTOR_CODE_STORE == "ephemeral":
+        return await store.consume(_key(user_id), code)
+
+    now = datetime.now(timezone.utc)
+    stmt = lambda_stmt(lambda: (
+        delete(TwoFactorAuthCode)
+        .where(
+            TwoFactorAuthCode.id == user_id,
+            TwoFactorAuthCode.code == code,
+            TwoFactorAuthCode.expires_at > now,
+        )
+        .returning(TwoFactorAuthCode.id)
+    ))
+    async with single_writer.slot():
+        result = await db.execute(stmt, execution_options={"query_name": "consume_2fa_code"})
+        consumed = result.first()
+        await db.commit()
+    return consumed is not None